@@ -0,0 +1,258 @@
+"""Wall clock time of whole cli runs against a fake Blogger api.
+
+Each scenario runs the cli in a fresh process, with its own home (holding
+fake credentials) and cache dir, against a benchmarks.fakeblogger server
+with the given latency and error rate:
+
+    file      publishes N generated posts, then edits them all and
+              publishes again (file-update)
+    get-doc   exports N remote posts as markdown documents (get -d -w) -
+              needs pandoc
+    delete    deletes N posts in one go
+
+Results are written as json - to benchmarks/results/<commit>.json by
+default - and compared with an earlier run's with --compare.
+
+The cli runs with its default settings, except for --rate and --retries
+if they're given.
+
+    python -m benchmarks.api [-n POSTS] [--latency MS] [--error-rate R]
+                             [--rate R] [--retries N] [--compare OLD.json]
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fakeblogger import BLOG_ID, FakeBlogger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["file", "file-update", "get-doc", "delete"]
+
+POST = u"""+++
+title = "Benchmark post %(i)d"
+format = "html"
+tags = ["bench", "generated"]
+draft = false
++++
+%(body)s
+"""
+
+
+def _which(name):
+    for path in os.environ.get("PATH", "").split(os.pathsep):
+        if os.access(os.path.join(path, name), os.X_OK):
+            return True
+    return False
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Workspace(object):
+    """A home with fake credentials, a cache dir and a directory of posts"""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="easyblogger-bench-")
+        self.home = os.path.join(self.root, "home")
+        self.posts = os.path.join(self.root, "posts")
+        for d in (self.home, self.posts):
+            os.makedirs(d)
+        from oauth2client.client import OAuth2Credentials
+        from oauth2client.file import Storage
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(days=365)
+        Storage(os.path.join(self.home, ".easyblogger.credentials")).put(
+            OAuth2Credentials("fake-token", "client", "secret", "refresh",
+                              expiry, "http://127.0.0.1/token", "bench"))
+        self.env = dict(os.environ)
+        self.env.update({"HOME": self.home,
+                         "EASYBLOGGER_CACHE_DIR":
+                             os.path.join(self.root, "cache"),
+                         "PYTHONPATH": ROOT})
+
+    def writePosts(self, count, size, revision=0):
+        paragraph = "<p>revision %d - %s</p>\n" % (
+            revision, "lorem ipsum dolor sit amet " * 8)
+        body = paragraph * max(1, size // len(paragraph))
+        for i in range(count):
+            filename = os.path.join(self.posts, "post%04d.html" % i)
+            existing = None
+            if os.path.exists(filename):
+                # keep the id the first publish wrote into the frontmatter
+                with open(filename) as f:
+                    existing = f.read().split("+++")[1]
+            with open(filename, "w") as f:
+                if existing:
+                    f.write("+++%s+++\n%s" % (existing, body))
+                else:
+                    f.write(POST % {"i": i, "body": body})
+
+    def run(self, endpoint, argv, cwd=None):
+        cmd = [sys.executable, "-m", "blogger.main", "--api-endpoint",
+               endpoint, "--blogid", BLOG_ID] + argv
+        start = time.time()
+        proc = subprocess.Popen(cmd, env=self.env, cwd=cwd or self.root,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        elapsed = time.time() - start
+        if proc.returncode:
+            sys.stderr.write(err.decode("utf-8", "replace"))
+        return elapsed, proc.returncode
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _measure(server, workspace, argv, cwd=None):
+    server.calls.clear()
+    server.errors = server.httpRequests = server.bytesSent = 0
+    elapsed, code = workspace.run(server.url, argv, cwd)
+    return {"seconds": round(elapsed, 3), "exitCode": code,
+            "httpRequests": server.httpRequests,
+            "bytesSent": server.bytesSent,
+            "calls": dict(server.calls),
+            "injectedErrors": server.errors}
+
+
+def run(args):
+    server = FakeBlogger(latency=args.latency / 1000.0,
+                         errorRate=args.errorRate, seed=args.seed)
+    server.url = server.start()
+    workspace = Workspace()
+    # the cli's defaults unless asked otherwise
+    extra = []
+    if args.rate is not None:
+        extra += ["--rate", str(args.rate)]
+    if args.retries is not None:
+        extra += ["--retries", str(args.retries)]
+    results = {}
+    try:
+        scenarios = args.scenarios
+        if "file" in scenarios or "file-update" in scenarios:
+            workspace.writePosts(args.posts, args.size)
+            files = os.path.join(workspace.posts, "*.html")
+            results["file"] = _measure(server, workspace,
+                                       extra + ["file", files])
+            if "file-update" in scenarios:
+                workspace.writePosts(args.posts, args.size, revision=1)
+                results["file-update"] = _measure(server, workspace,
+                                                  extra + ["file", files])
+            if "file" not in scenarios:
+                del results["file"]
+        if "get-doc" in scenarios:
+            if _which("pandoc"):
+                server.seed(args.posts, labels=["remote"],
+                            contentSize=args.size)
+                out = tempfile.mkdtemp(dir=workspace.root)
+                results["get-doc"] = _measure(
+                    server, workspace,
+                    extra + ["get", "-l", "remote", "-c", str(args.posts),
+                             "-d", "markdown", "-w"], cwd=out)
+                results["get-doc"]["files"] = len(
+                    glob.glob(os.path.join(out, "*")))
+            else:
+                results["get-doc"] = {"skipped": "pandoc not found"}
+        if "delete" in scenarios:
+            ids = server.seed(args.posts, labels=["doomed"])
+            results["delete"] = _measure(server, workspace,
+                                         extra + ["delete"] + ids)
+    finally:
+        server.stop()
+        workspace.close()
+    return {"commit": _commit(),
+            "python": platform.python_version(),
+            "params": {"posts": args.posts, "size": args.size,
+                       "latencyMs": args.latency,
+                       "errorRate": args.errorRate, "seed": args.seed,
+                       "flags": extra},
+            "results": results}
+
+
+def compare(old, new):
+    lines = ["%-12s %9s %9s %8s" % ("scenario", "old s", "new s", "change")]
+    for name in SCENARIOS:
+        a = old["results"].get(name, {}).get("seconds")
+        b = new["results"].get(name, {}).get("seconds")
+        if a is None or b is None:
+            continue
+        lines.append("%-12s %9.3f %9.3f %+7.1f%%" % (
+            name, a, b, (b - a) / a * 100 if a else 0))
+    return "\n".join(lines)
+
+
+def main(sysargv=sys.argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.api")
+    parser.add_argument("-n", "--posts", type=int, default=100,
+                        help="posts per scenario")
+    parser.add_argument("--size", type=int, default=4096,
+                        help="bytes of content per post")
+    parser.add_argument("--latency", type=float, default=50,
+                        help="milliseconds the fake api takes per request")
+    parser.add_argument("--error-rate", dest="errorRate", type=float,
+                        default=0.0,
+                        help="fraction of api calls failing with a 503")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the injected errors")
+    parser.add_argument("--rate", type=float,
+                        help="easyblogger's --rate - default: its default")
+    parser.add_argument("--retries", type=int,
+                        help="easyblogger's --retries - default: its default")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","),
+                        default=SCENARIOS,
+                        help="comma separated - default: all of %s" %
+                        ",".join(SCENARIOS))
+    parser.add_argument("--output",
+                        help="results file - default: " +
+                        "benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", metavar="OLD",
+                        help="results of an earlier run to compare with")
+    args = parser.parse_args(sysargv[1:])
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: %s" % ",".join(sorted(unknown)))
+
+    results = run(args)
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         "%s.json" % results["commit"])
+    if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    for name in SCENARIOS:
+        r = results["results"].get(name)
+        if r is None:
+            continue
+        if "skipped" in r:
+            print("%-12s skipped - %s" % (name, r["skipped"]))
+            continue
+        print("%-12s %8.3fs exit %d, %d http requests, %d api calls, "
+              "%d injected errors" % (name, r["seconds"], r["exitCode"],
+                                      r["httpRequests"],
+                                      sum(r["calls"].values()),
+                                      r["injectedErrors"]))
+    print("results written to %s" % output)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), results))
+    failed = [name for name, r in results["results"].items()
+              if r.get("exitCode")]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""An in-process stand in for the Blogger v3 api.
+
+Serves the endpoints easyblogger uses - blogs (listByUser, getByUrl, get),
+posts (list with paging, get, getByPath, search, insert, patch, update,
+publish, revert, delete) and multipart batches - from memory, with
+configurable latency and injected errors. Point the cli at it with
+``--api-endpoint`` (see benchmarks.api).
+
+    server = FakeBlogger(latency=0.02, errorRate=0.01)
+    server.seed(100)
+    url = server.start()
+    ...
+    server.stop()
+"""
+import email.parser
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    # py2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+BLOG_ID = "1000"
+BLOG_URL = "http://bench.example.com/"
+
+# (http method, path pattern, handler name)
+ROUTES = [
+    ("GET", r"/v3/users/(?P<userId>[^/]+)/blogs", "listBlogs"),
+    ("GET", r"/v3/blogs/byurl", "getBlogByUrl"),
+    ("GET", r"/v3/blogs/(?P<blogId>\d+)/posts", "listPosts"),
+    ("POST", r"/v3/blogs/(?P<blogId>\d+)/posts", "insertPost"),
+    ("GET", r"/v3/blogs/(?P<blogId>\d+)/posts/search", "searchPosts"),
+    ("GET", r"/v3/blogs/(?P<blogId>\d+)/posts/bypath", "getPostByPath"),
+    ("GET", r"/v3/blogs/(?P<blogId>\d+)/posts/(?P<postId>\d+)", "getPost"),
+    ("PATCH", r"/v3/blogs/(?P<blogId>\d+)/posts/(?P<postId>\d+)",
+     "patchPost"),
+    ("PUT", r"/v3/blogs/(?P<blogId>\d+)/posts/(?P<postId>\d+)",
+     "updatePost"),
+    ("DELETE", r"/v3/blogs/(?P<blogId>\d+)/posts/(?P<postId>\d+)",
+     "deletePost"),
+    ("POST", r"/v3/blogs/(?P<blogId>\d+)/posts/(?P<postId>\d+)/publish",
+     "publishPost"),
+    ("POST", r"/v3/blogs/(?P<blogId>\d+)/posts/(?P<postId>\d+)/revert",
+     "revertPost"),
+    ("GET", r"/v3/blogs/(?P<blogId>\d+)", "getBlog"),
+]
+ROUTES = [(m, re.compile(p + "$"), h) for m, p, h in ROUTES]
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message, reason="invalid"):
+        Exception.__init__(self, message)
+        self.status = status
+        self.reason = reason
+
+    def body(self):
+        return {"error": {"code": self.status, "message": str(self),
+                          "errors": [{"reason": self.reason,
+                                      "message": str(self)}]}}
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+class FakeBlogger(object):
+    """The api's state (one blog) and its handlers. ``calls`` counts the
+    requests served per handler, batched ones included."""
+
+    def __init__(self, latency=0.0, errorRate=0.0, errorStatus=503, seed=0):
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.random = random.Random(seed)
+        self.blog = {"kind": "blogger#blog", "id": BLOG_ID,
+                     "name": "Benchmark blog", "url": BLOG_URL}
+        self.posts = {}
+        self.nextId = 1
+        self.calls = Counter()
+        self.errors = 0
+        self.httpRequests = 0
+        self.bytesSent = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    # state
+
+    def _newPost(self, body, status):
+        with self.lock:
+            postId = str(self.nextId)
+            self.nextId += 1
+        now = _now()
+        slug = re.sub(r"[^a-z0-9]+", "-",
+                      (body.get("title") or postId).lower()).strip("-")
+        post = {"kind": "blogger#post", "id": postId,
+                "blog": {"id": BLOG_ID},
+                "title": body.get("title", ""),
+                "content": body.get("content", ""),
+                "labels": body.get("labels") or [],
+                "published": body.get("published") or now,
+                "updated": now,
+                "url": "%s%s/%s-%s.html" % (BLOG_URL, now[:7].replace(
+                    "-", "/"), slug, postId),
+                "author": {"id": "1", "displayName": "Bench"},
+                "replies": {"totalItems": "0"},
+                "status": status}
+        with self.lock:
+            self.posts[postId] = post
+        return post
+
+    def seed(self, count, labels=("bench",), contentSize=4096):
+        """Adds count live posts - returns their ids"""
+        paragraph = "<p>%s</p>\n" % ("lorem ipsum dolor sit amet " * 8)
+        content = paragraph * max(1, contentSize // len(paragraph))
+        return [self._newPost({"title": "Seeded post %d" % i,
+                               "content": content,
+                               "labels": list(labels)}, "LIVE")["id"]
+                for i in range(count)]
+
+    def _post(self, postId):
+        post = self.posts.get(postId)
+        if post is None:
+            raise ApiError(404, "Not Found", "notFound")
+        return post
+
+    def _view(self, post, query):
+        if query.get("fetchBodies", ["true"])[0] == "false":
+            post = dict(post)
+            post.pop("content", None)
+        return post
+
+    # handlers - (params, query, body) to a response body
+
+    def listBlogs(self, params, query, body):
+        return {"kind": "blogger#blogList", "items": [self.blog]}
+
+    def getBlogByUrl(self, params, query, body):
+        return self.blog
+
+    def getBlog(self, params, query, body):
+        return self.blog
+
+    def _page(self, posts, query):
+        orderBy = query.get("orderBy", ["published"])[0]
+        posts.sort(key=lambda p: (p[orderBy], int(p["id"])), reverse=True)
+        start = int(query.get("pageToken", ["0"])[0])
+        size = int(query.get("maxResults", ["10"])[0])
+        page = posts[start:start + size]
+        result = {"kind": "blogger#postList",
+                  "items": [self._view(p, query) for p in page]}
+        if start + size < len(posts):
+            result["nextPageToken"] = str(start + size)
+        return result
+
+    def listPosts(self, params, query, body):
+        posts = list(self.posts.values())
+        labels = [l for l in query.get("labels", [""])[0].split(",") if l]
+        if labels:
+            posts = [p for p in posts if set(labels) & set(p["labels"])]
+        statuses = [s.upper() for s in query.get("status", [])]
+        if statuses:
+            posts = [p for p in posts if p["status"] in statuses]
+        return self._page(posts, query)
+
+    def searchPosts(self, params, query, body):
+        q = query.get("q", [""])[0].lower()
+        return self._page([p for p in self.posts.values()
+                           if q in p["title"].lower() or
+                           q in p["content"].lower()], query)
+
+    def getPost(self, params, query, body):
+        return self._post(params["postId"])
+
+    def getPostByPath(self, params, query, body):
+        path = query.get("path", [""])[0]
+        for post in self.posts.values():
+            if post["url"].endswith(path):
+                return post
+        raise ApiError(404, "Not Found", "notFound")
+
+    def insertPost(self, params, query, body):
+        isDraft = query.get("isDraft", ["false"])[0] == "true"
+        return self._newPost(body, "DRAFT" if isDraft else "LIVE")
+
+    def patchPost(self, params, query, body):
+        post = self._post(params["postId"])
+        for key in ("title", "content", "labels", "published"):
+            if key in body:
+                post[key] = body[key]
+        post["updated"] = _now()
+        return post
+
+    def updatePost(self, params, query, body):
+        post = self._post(params["postId"])
+        for key in ("title", "content", "labels", "published"):
+            post[key] = body.get(key, post[key] if key == "published"
+                                 else None)
+        post["labels"] = post["labels"] or []
+        post["updated"] = _now()
+        return post
+
+    def publishPost(self, params, query, body):
+        post = self._post(params["postId"])
+        post["status"] = "LIVE"
+        return post
+
+    def revertPost(self, params, query, body):
+        post = self._post(params["postId"])
+        post["status"] = "DRAFT"
+        return post
+
+    def deletePost(self, params, query, body):
+        self._post(params["postId"])
+        with self.lock:
+            del self.posts[params["postId"]]
+        return None
+
+    # dispatch
+
+    def call(self, method, url, body):
+        """Serves one (possibly batched) request - returns (status, body)"""
+        parsed = urlparse(url)
+        for m, pattern, name in ROUTES:
+            match = pattern.match(parsed.path)
+            if m == method and match:
+                break
+        else:
+            return 404, ApiError(404, "No route for %s %s" %
+                                 (method, parsed.path)).body()
+        with self.lock:
+            self.calls[name] += 1
+            fail = self.errorRate and self.random.random() < self.errorRate
+            if fail:
+                self.errors += 1
+        if fail:
+            return self.errorStatus, ApiError(
+                self.errorStatus, "Injected error",
+                "rateLimitExceeded" if self.errorStatus == 403
+                else "backendError").body()
+        try:
+            body = json.loads(body.decode("utf-8")) if body else {}
+            return 200, getattr(self, name)(match.groupdict(),
+                                            parse_qs(parsed.query), body)
+        except ApiError as e:
+            return e.status, e.body()
+
+    def batch(self, contentType, body):
+        """Serves a multipart/mixed batch - returns (contentType, body)"""
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + contentType.encode("ascii") + b"\r\n\r\n" +
+            body)
+        boundary = "batch_fake_boundary"
+        parts = []
+        for part in message.get_payload():
+            request = part.get_payload(decode=True)
+            head, _, payload = request.partition(b"\r\n\r\n")
+            if not _:
+                head, _, payload = request.partition(b"\n\n")
+            requestLine = head.splitlines()[0].decode("utf-8")
+            method, url = requestLine.split(" ")[:2]
+            status, result = self.call(method, url, payload.strip())
+            data = json.dumps(result).encode("utf-8") \
+                if result is not None else b""
+            contentId = part["Content-ID"].strip("<>")
+            parts.append(
+                ("--%s\r\nContent-Type: application/http\r\n"
+                 "Content-ID: <response-%s>\r\n\r\n"
+                 "HTTP/1.1 %d OK\r\nContent-Type: application/json\r\n"
+                 "Content-Length: %d\r\n\r\n" %
+                 (boundary, contentId, status, len(data))).encode("utf-8") +
+                data + b"\r\n")
+        return ("multipart/mixed; boundary=%s" % boundary,
+                b"".join(parts) + ("--%s--\r\n" % boundary).encode("utf-8"))
+
+    # server
+
+    def start(self):
+        """Serves on a free localhost port - returns the api endpoint"""
+        self.server = _Server(("127.0.0.1", 0), _handler(self))
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return "http://127.0.0.1:%d/" % self.server.server_address[1]
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _handler(api):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _serve(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            with api.lock:
+                api.httpRequests += 1
+            if api.latency:
+                time.sleep(api.latency)
+            if urlparse(self.path).path.rstrip("/").endswith("/batch"):
+                contentType, data = api.batch(
+                    self.headers.get("Content-Type"), body)
+                status = 200
+            else:
+                status, result = api.call(self.command, self.path, body)
+                contentType = "application/json; charset=UTF-8"
+                data = json.dumps(result).encode("utf-8") \
+                    if result is not None else b""
+            with api.lock:
+                api.bytesSent += len(data)
+            self.send_response(status if data or status != 200 else 204)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,106 @@
+"""Frontmatter detection - blogger.frontmatter.scan against the regular
+expressions ContentArgParser used before it (both tried on every document,
+toml first, each capturing the whole body).
+
+Scenarios are a few large documents and many small ones, with toml and yaml
+frontmatter. Times are the best of n runs.
+
+    python -m benchmarks.frontmatter [-n RUNS] [--json]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+
+from blogger.frontmatter import scan
+
+RE_TOML = re.compile(r"^\+\+\+\s*$(.*?)^\+\+\+\s*$(.*)",
+                     re.MULTILINE | re.DOTALL)
+RE_YAML = re.compile(r"^\s*((<!--)|(////))\s*$(.*?)^\s*((-->)|(////))\s*$(.*)",
+                     re.MULTILINE | re.DOTALL)
+
+TOML = u"""+++
+title = "Post %d"
+id = "1234567890"
+tags = ["bench", "frontmatter"]
+draft = false
++++
+"""
+YAML = u"""<!--
+Title: Post %d
+PostId: 1234567890
+Labels: bench, frontmatter
+-->
+"""
+PARAGRAPH = u"Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n\n"
+
+
+def regex(document):
+    isToml = RE_TOML.findall(document)
+    isYaml = RE_YAML.findall(document)
+    if isToml:
+        return isToml[0][0], isToml[0][-1]
+    return isYaml[0][3], isYaml[0][-1]
+
+
+def scanner(document):
+    found = scan(document)
+    return found.text, found.body
+
+
+def documents(header, count, size):
+    body = PARAGRAPH * max(1, size // len(PARAGRAPH))
+    return [header % i + body for i in range(count)]
+
+
+SCENARIOS = {
+    "large-toml": lambda: documents(TOML, 10, 2 * 1024 * 1024),
+    "large-yaml": lambda: documents(YAML, 10, 2 * 1024 * 1024),
+    "small-toml": lambda: documents(TOML, 5000, 2048),
+    "small-yaml": lambda: documents(YAML, 5000, 2048),
+}
+
+
+def _best(fn, docs, runs):
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        for doc in docs:
+            fn(doc)
+        timings.append(time.time() - start)
+    return min(timings) * 1000
+
+
+def run(runs):
+    results = {}
+    for name, make in sorted(SCENARIOS.items()):
+        docs = make()
+        for doc in docs[:3]:
+            # same frontmatter and body either way
+            assert regex(doc) == scanner(doc), name
+        results[name] = {"documents": len(docs),
+                         "regexMs": round(_best(regex, docs, runs), 2),
+                         "scanMs": round(_best(scanner, docs, runs), 2)}
+    return results
+
+
+def main(sysargv=sys.argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.frontmatter")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true",
+                        help="print results as json")
+    args = parser.parse_args(sysargv[1:])
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return 0
+    for name, r in sorted(results.items()):
+        print("%-11s %5d docs  regex %9.2fms  scan %9.2fms  %6.1fx" % (
+            name, r["documents"], r["regexMs"], r["scanMs"],
+            r["regexMs"] / r["scanMs"] if r["scanMs"] else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Startup time of the easyblogger cli, per subcommand.
+
+Each scenario starts a fresh interpreter, imports ``blogger.main`` and parses
+the command line - everything the cli does before it starts real work. The
+best time over the interpreter's own startup is checked against a budget
+and the scenario fails if any of the slow optional modules got imported.
+
+    python -m benchmarks.startup [-n RUNS]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# best of n runs, in milliseconds over a bare ``python -c pass``
+BUDGETS = {
+    "help": 50,
+    "listblogs": 50,
+    "get": 50,
+    "post": 50,
+    "update": 50,
+    "delete": 50,
+    "file": 50,
+}
+
+SCENARIOS = {
+    "help": ["--help"],
+    "listblogs": ["listblogs"],
+    "get": ["get", "-l", "abc"],
+    "post": ["post", "-t", "t", "-c", "content"],
+    "update": ["update", "1234", "-c", "content"],
+    "delete": ["delete", "1234", "5678"],
+    "file": ["file", "*.md"],
+}
+
+# none of these are needed to parse a command line
+HEAVY_MODULES = ["gevent", "googleapiclient", "oauth2client", "httplib2",
+                 "pypandoc", "yaml", "toml", "chardet", "coloredlogs",
+                 "sqlite3"]
+
+PROBE = """
+import sys
+from blogger.main import parse_args
+try:
+    parse_args(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stdout.write("\nloaded:" + ",".join(m for m in %r if m in sys.modules))
+""" % HEAVY_MODULES
+
+
+def _time(cmd):
+    start = time.time()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    out, _ = proc.communicate()
+    elapsed = (time.time() - start) * 1000
+    lines = out.decode("utf-8").splitlines() or [""]
+    loaded = lines[-1]
+    if not loaded.startswith("loaded:"):
+        return elapsed, ""
+    return elapsed, loaded[len("loaded:"):]
+
+
+def run(runs):
+    baseline = min([_time([sys.executable, "-c", "pass"])[0]
+                        for i in range(runs)])
+    results = {}
+    for name, argv in sorted(SCENARIOS.items()):
+        timings = []
+        loaded = ""
+        for i in range(runs):
+            elapsed, loaded = _time([sys.executable, "-c", PROBE] + argv)
+            timings.append(elapsed)
+        results[name] = {"ms": round(min(timings) - baseline, 1),
+                         "budget": BUDGETS[name],
+                         "heavyModules": loaded.split(",") if loaded else []}
+    return baseline, results
+
+
+def main(sysargv=sys.argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.startup")
+    parser.add_argument("-n", "--runs", type=int, default=7)
+    parser.add_argument("--json", action="store_true",
+                        help="print results as json")
+    args = parser.parse_args(sysargv[1:])
+    baseline, results = run(args.runs)
+    failed = [name for name, r in results.items()
+              if r["ms"] > r["budget"] or r["heavyModules"]]
+    if args.json:
+        print(json.dumps({"baseline": baseline, "results": results},
+                         indent=2, sort_keys=True))
+    else:
+        print("interpreter startup: %.1fms" % baseline)
+        for name, r in sorted(results.items()):
+            print("%-10s %7.1fms (budget %dms) %s" % (
+                name, r["ms"], r["budget"],
+                "imports " + ",".join(r["heavyModules"])
+                if r["heavyModules"] else ""))
+    if failed:
+        print("over budget: %s" % ", ".join(sorted(failed)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Yaml frontmatter parsing and writing - blogger.frontmatter's codec (libyaml
+when pyyaml was built with it) against pyyaml's pure python loader and
+dumper that it replaced. Times are the best of n runs over a few thousand
+frontmatters like the ones get -d writes and file reads.
+
+    python -m benchmarks.yamlcodec [-n RUNS] [--json]
+"""
+import argparse
+import json
+import sys
+import time
+
+import yaml
+
+from blogger.frontmatter import dumpYaml, loadYaml
+
+COUNT = 5000
+
+
+def frontmatters(count):
+    return [{"title": u"Post %d - caf\xe9 notes on something or other" % i,
+             "id": str(8010087245053438499 + i),
+             "tags": ["bench", "frontmatter", "label %d" % (i % 10)],
+             "aliases": ["http://example.blogspot.com/2018/04/post-%d.html"
+                         % i],
+             "publishdate": "2018-04-30T12:42:00+05:30",
+             "draft": i % 3 == 0,
+             "date": "2018-04-30T12:42:00+05:30",
+             "lastmod": "2018-04-30T12:47:37+05:30"}
+            for i in range(count)]
+
+
+def _best(fn, items, runs):
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        for item in items:
+            fn(item)
+        timings.append(time.time() - start)
+    return min(timings) * 1000
+
+
+def run(runs):
+    data = frontmatters(COUNT)
+    texts = [dumpYaml(d) for d in data]
+    return {
+        "libyaml": bool(getattr(yaml, "__with_libyaml__", False)),
+        "documents": COUNT,
+        "load": {
+            "pyyamlMs": round(_best(
+                lambda t: yaml.load(t, Loader=yaml.FullLoader), texts,
+                runs), 1),
+            "codecMs": round(_best(loadYaml, texts, runs), 1)},
+        "dump": {
+            "pyyamlMs": round(_best(
+                lambda d: yaml.dump(d, allow_unicode=True), data, runs), 1),
+            "codecMs": round(_best(dumpYaml, data, runs), 1)},
+    }
+
+
+def main(sysargv=sys.argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.yamlcodec")
+    parser.add_argument("-n", "--runs", type=int, default=3)
+    parser.add_argument("--json", action="store_true",
+                        help="print results as json")
+    args = parser.parse_args(sysargv[1:])
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return 0
+    print("%d frontmatters, libyaml %s" % (
+        results["documents"], "available" if results["libyaml"]
+        else "not available"))
+    for name in ("load", "dump"):
+        r = results[name]
+        print("%-5s pyyaml %8.1fms  codec %8.1fms  %5.1fx" % (
+            name, r["pyyamlMs"], r["codecMs"],
+            r["pyyamlMs"] / r["codecMs"] if r["codecMs"] else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,22 +14,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import logging
 import os
 import os.path
 import re
+import shutil
 import sys
-import toml
-import yaml
+import threading
+from contextlib import contextmanager
+try:
+    import queue
+except ImportError:
+    # py2
+    import Queue as queue
 from subprocess import check_output
-from tempfile import NamedTemporaryFile
-import httplib2
-import pypandoc
-from apiclient.discovery import build
-from apiclient.errors import HttpError
-from oauth2client import tools
-from oauth2client.client import OAuth2WebServerFlow
-from oauth2client.file import Storage
+from tempfile import NamedTemporaryFile, mkdtemp
+from .cache import binaryFingerprint, conversionKey
+from .discovery import getDiscoveryDocument
+from .engine import NO_LIMIT
+from .formats import getFormatCache
+from .frontmatter import loadYaml, rewrite as rewriteFrontmatter, \
+    scan as scanFrontmatter
+from .metrics import inc, meterHttp, timer
+from .pandocserver import getConverter
+from .ratelimit import isRetryable
+from .trace import span
+from .transport import HttpPool
+# The google api client, oauth2client, pypandoc, toml and yaml are slow to
+# import and not every command needs them - they're imported where they are
+# used so that the cli starts quickly.
 try:
     unicode = unicode
 except NameError:
@@ -47,6 +61,19 @@ else:
 logger = logging.getLogger(__name__)
 
 
+def _method(request):
+    """posts.list etc - the api method a request calls, or batch"""
+    methodId = getattr(request, "methodId", None)
+    if not isinstance(methodId, basestring):
+        return "batch"
+    return methodId.split(".", 1)[-1]
+
+
+def _status(error):
+    """The http status a request failed with, or error if it got none"""
+    return getattr(getattr(error, "resp", None), "status", None) or "error"
+
+
 class EasyBlogger(object):
 
     @staticmethod
@@ -62,13 +89,37 @@ class EasyBlogger(object):
             lbl = [i.strip() for i in labels if i.strip()]
             return lbl if lbl else None
 
-    def __init__(self, clientId, clientSecret, blogId=None, blogUrl=None):
+    # requests sent per http round trip by the batch methods
+    batchSize = 50
+
+    def __init__(self, clientId, clientSecret, blogId=None, blogUrl=None,
+                 apiEndpoint=None):
         self.clientId = clientId
         self.clientSecret = clientSecret
         self.service = None
+        self.credentials = None
+        # one instance is shared by all the workers of a run - the lock
+        # guards the one time setup (credentials, service, blog id) and
+        # requests take a connection from the pool since httplib2.Http can't
+        # be shared between workers
+        self._lock = threading.RLock()
+        self._httpPool = None
         self.blogId = blogId
         self.blogUrl = blogUrl
-        self.converter = pypandoc
+        # talk to a different server (ex: a local stand in) than the one in
+        # the discovery document
+        self.apiEndpoint = apiEndpoint
+        self.converter = None
+        # a ConversionCache - rendered html is reused for unchanged input
+        self.conversionCache = None
+        # (format, source) to html converted ahead of time by prerender
+        self._rendered = {}
+        # semaphores bounding concurrent api requests and conversions when
+        # the instance is shared by many workers (see Engine.semaphore)
+        self.apiLimit = NO_LIMIT
+        self.convertLimit = NO_LIMIT
+        # a RateLimiter pacing and retrying requests
+        self.limiter = None
         self.check_output = check_output
         self.namedTemporaryFile = NamedTemporaryFile
         self.open = open
@@ -83,6 +134,16 @@ class EasyBlogger(object):
         """
         if self.service:
             return self.service
+        with self._lock:
+            if not self.service:
+                self.service = self._buildService()
+        return self.service
+
+    def _buildService(self):
+        from apiclient.discovery import build_from_document
+        from oauth2client import tools
+        from oauth2client.client import OAuth2WebServerFlow
+        from oauth2client.file import Storage
         # The scope URL for read/write access to a user's blogger data
         scope = 'https://www.googleapis.com/auth/blogger'
 
@@ -109,144 +170,470 @@ class EasyBlogger(object):
         # data.  If the user grants access, the run() function returns new
         # credentials.  The new credentials are also stored in the supplied
         # Storage object, which updates the credentials.dat file.
-        if credentials is None or credentials.invalid:
-            flags = tools.argparser.parse_args(args=[])
-            credentials = tools.run_flow(flow, storage, flags)
+        with span("oauth"):
+            if credentials is None or credentials.invalid:
+                flags = tools.argparser.parse_args(args=[])
+                credentials = tools.run_flow(flow, storage, flags)
 
         # Create an httplib2.Http object to handle our HTTP requests, and
         # authorize it using the credentials.authorize() function.
-        http = httplib2.Http()
-        http.disable_ssl_certificate_validation = True
-        http = credentials.authorize(http)
-
-        # The apiclient.discovery.build() function returns an instance of an
-        # API service object can be used to make API calls. The object is
-        # constructed with methods specific to the blogger API. The arguments
-        # provided are:
-        #   name of the API ('blogger')
-        #   version of the API you are using ('v3')
+        self.credentials = credentials
+        http = self._newHttp()
+
+        # The apiclient.discovery.build_from_document() function returns an
+        # instance of an API service object can be used to make API calls.
+        # The object is constructed with methods specific to the blogger API
+        # from its discovery document, which is kept locally so that it isn't
+        # fetched on every run. The arguments provided are:
+        #   the blogger v3 discovery document
         #   authorized httplib2.Http() object that can be used for API calls
-        self.service = build('blogger', 'v3', http=http, cache_discovery=False)
-        return self.service
+        #   client options - only used to point at a different api endpoint
+        clientOptions = None
+        if self.apiEndpoint:
+            clientOptions = {"api_endpoint": self.apiEndpoint}
+        with span("discovery"):
+            return build_from_document(getDiscoveryDocument(), http=http,
+                                       client_options=clientOptions)
+
+    def _newHttp(self):
+        """An http object authorized with the (shared) credentials"""
+        import httplib2
+        return meterHttp(self.credentials.authorize(httplib2.Http()))
+
+    @contextmanager
+    def _http(self):
+        """An authorized http object from the pool for the duration of a
+        request"""
+        if not self.credentials:
+            # service was provided rather than built - let it use its own
+            yield None
+            return
+        if self._httpPool is None:
+            with self._lock:
+                if self._httpPool is None:
+                    self._httpPool = HttpPool(self._newHttp, self.httpPoolSize)
+        with self._httpPool.connection() as http:
+            yield http
+
+    def _execute(self, request, cost=1, idempotent=True):
+        """Sends a request (cost is the number of api calls it makes - more
+        than one for a batch), paced and retried by the limiter if any.
+        Requests that aren't idempotent are only retried if rate limited."""
+        method = _method(request)
+
+        def send():
+            with self.apiLimit, self._http() as http, \
+                    span(getattr(request, "methodId", None) or "batch",
+                         requests=cost), \
+                    timer("api_request_duration_seconds", method=method):
+                try:
+                    response = request.execute(http=http)
+                except Exception as e:
+                    if method != "batch":
+                        inc("api_requests_total", method=method,
+                            status=_status(e))
+                    raise
+                if method != "batch":
+                    inc("api_requests_total", method=method, status=200)
+                return response
+        if self.limiter is None:
+            return send()
+        return self.limiter.call(send, cost, idempotent)
+
+    def _newBatch(self, callback):
+        if self.apiEndpoint:
+            # the service's batch uri comes from the discovery document and
+            # ignores the endpoint override
+            from apiclient.http import BatchHttpRequest
+            return BatchHttpRequest(callback=callback,
+                                    batch_uri=self.apiEndpoint.rstrip("/") +
+                                    "/batch")
+        return self._OAuth_Authenticate().new_batch_http_request(
+            callback=callback)
+
+    def _executeBatch(self, requests, batchSize=None):
+        """Executes (key, request) pairs, up to batchSize requests per http
+        round trip. Yields (key, response, exception) in the order given -
+        exception is the HttpError for that request or None"""
+        from apiclient.errors import HttpError
+        batchSize = batchSize or self.batchSize
+        requests = list(requests)
+        for start in range(0, len(requests), batchSize):
+            chunk = requests[start:start + batchSize]
+            if len(chunk) == 1:
+                # not worth the multipart overhead
+                key, request = chunk[0]
+                try:
+                    yield key, self._execute(request), None
+                except HttpError as he:
+                    yield key, None, he
+                continue
+            results = {}
+
+            def callback(requestId, response, exception):
+                results[requestId] = (response, exception)
+            batch = self._newBatch(callback)
+            for i, (key, request) in enumerate(chunk):
+                batch.add(request, request_id=str(i))
+            self._execute(batch, len(chunk))
+            for i, (key, request) in enumerate(chunk):
+                response, exception = results[str(i)]
+                inc("api_requests_total", method=_method(request),
+                    status=_status(exception) if exception else 200)
+                if exception is not None and self.limiter is not None and \
+                        isRetryable(exception):
+                    # rate limited within the batch - send it on its own
+                    try:
+                        response, exception = self._execute(request), None
+                    except HttpError as he:
+                        exception = he
+                yield key, response, exception
 
     def _setBlog(self):
         if self.blogId:
             return
         service = self._OAuth_Authenticate()
-        request = service.blogs().getByUrl(url=self.blogUrl)
-        blog = request.execute()
-        self.blogId = blog['id']
+        with self._lock:
+            if self.blogId:
+                return
+            with span("setBlog"):
+                request = service.blogs().getByUrl(url=self.blogUrl)
+                blog = self._execute(request)
+                self.blogId = blog['id']
+
+    # fields of the api's resources - others can't be asked for in a
+    # partial response (the api rejects the request)
+    POST_FIELDS = frozenset(["kind", "id", "blog", "published", "updated",
+                             "url", "selfLink", "title", "titleImageUrl",
+                             "content", "author", "replies", "labels",
+                             "customMetaData", "location", "images", "status",
+                             "etag", "readerComments", "trashed"])
+    BLOG_FIELDS = frozenset(["kind", "id", "name", "description", "published",
+                             "updated", "url", "selfLink", "posts", "pages",
+                             "locale", "customMetaData", "status"])
+
+    @staticmethod
+    def _projection(fields, known):
+        """fields= partial response selector for the given fields (a list or
+        comma separated string) of a resource, or None to get it whole"""
+        if not fields:
+            return None
+        if isinstance(fields, basestring):
+            fields = fields.split(",")
+        selected = []
+        for f in fields:
+            f = f.strip()
+            if f in known and f not in selected:
+                selected.append(f)
+        return ",".join(selected) or None
 
     def getListOfBlogs(self, fields):
         service = self._OAuth_Authenticate()
-        request = service.blogs().listByUser(userId="self")
-        blogList = request.execute()
+        kwargs = {}
+        projection = self._projection(fields, self.BLOG_FIELDS)
+        if projection:
+            kwargs["fields"] = "items(%s)" % projection
+        request = service.blogs().listByUser(userId="self", **kwargs)
+        blogList = self._execute(request)
         fields = fields.split(",")
         for blogItem in blogList["items"]:
             line = [str(blogItem[k]).replace("&amp;", "&") for k in fields if k in blogItem]
             print(",".join(line))
 
+    # idle keep-alive connections kept for reuse
+    httpPoolSize = 4
+
+    # pages of posts fetched ahead while the caller works through the
+    # current one - 0 fetches each page only when it's needed
+    prefetchPages = 2
+
+    def _pages(self, request, nextRequest):
+        """Yields the response to request, then to each request that
+        nextRequest(request, response) returns until it returns None.
+        Pages are fetched in the background, up to prefetchPages ahead of
+        the caller."""
+        if not self.prefetchPages:
+            while request is not None:
+                response = self._execute(request)
+                yield response
+                request = nextRequest(request, response)
+            return
+        pages = queue.Queue(maxsize=self.prefetchPages)
+        stop = threading.Event()
+
+        def put(page):
+            # gives up once the caller stops reading
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch(request):
+            try:
+                while request is not None:
+                    response = self._execute(request)
+                    if not put((response, None)):
+                        return
+                    request = nextRequest(request, response)
+            except Exception as e:
+                put((None, e))
+                return
+            put((None, None))
+        fetcher = threading.Thread(target=fetch, args=(request,))
+        fetcher.daemon = True
+        fetcher.start()
+        try:
+            while True:
+                response, error = pages.get()
+                if error is not None:
+                    raise error
+                if response is None:
+                    return
+                yield response
+        finally:
+            stop.set()
+
     def getPosts(self, postId=None, query=None, labels="", url=None,
-                 fetchBodies=True, maxResults=None):
+                 fetchBodies=True, maxResults=None, orderBy=None,
+                 status=None, fields=None):
+        """Yields posts - by id, url, search query or labels. fields limits
+        the post fields downloaded (see _projection)"""
+        from apiclient.errors import HttpError
         self._setBlog()
         try:
             service = self._OAuth_Authenticate()
+            # partial response params for a single post and for lists
+            single = {}
+            listing = {}
+            projection = self._projection(fields, self.POST_FIELDS)
+            if projection:
+                single["fields"] = projection
+                listing["fields"] = "nextPageToken,items(%s)" % projection
             if postId:
                 request = service.posts().get(
-                    blogId=self.blogId, postId=postId, view="AUTHOR")
-                post = request.execute()
+                    blogId=self.blogId, postId=postId, view="AUTHOR",
+                    **single)
+                post = self._execute(request)
                 yield post
                 return
             elif query:
                 request = service.posts().search(blogId=self.blogId,
                                                  q=query,
-                                                 fetchBodies=fetchBodies)
+                                                 fetchBodies=fetchBodies,
+                                                 **listing)
             elif url:
                 regex = re.compile(r"^https?://.*?/")
                 if url.find("http") == 0:
                     url = "/" + regex.sub("", url)
                 logger.debug('getting post by url %s', url)
                 request = service.posts().getByPath(blogId=self.blogId,
-                                                    path=url)
-                post = request.execute()
+                                                    path=url, **single)
+                post = self._execute(request)
                 yield post
                 return
             else:
+                kwargs = dict(listing)
+                if orderBy:
+                    kwargs["orderBy"] = orderBy
+                if status:
+                    kwargs["status"] = status
                 request = service.posts().list(
                     blogId=self.blogId,
                     labels=labels,
                     view="AUTHOR",
                     fetchBodies=fetchBodies,
-                    maxResults=maxResults)
-            count = 0
-            while request:
-                response = request.execute()
+                    maxResults=maxResults,
+                    **kwargs)
+            count = [0]
+
+            def nextRequest(request, response):
+                count[0] += len(response.get("items", []))
+                if not response.get("items") or \
+                        not response.get("nextPageToken") or \
+                        (maxResults and count[0] >= maxResults):
+                    return None
+                if query:
+                    return service.posts().list_next(request, response)
+                # ask for just the posts still wanted
+                return service.posts().list(
+                    blogId=self.blogId,
+                    labels=labels,
+                    view="AUTHOR",
+                    fetchBodies=fetchBodies,
+                    maxResults=maxResults - count[0] if maxResults else None,
+                    pageToken=response["nextPageToken"],
+                    **kwargs)
+            remaining = maxResults
+            for response in self._pages(request, nextRequest):
                 if not "items" in response:
                     break
                 logger.debug("Got %s items", len(response["items"]))
-                count += len(response["items"])
-                for it in response["items"]:
+                items = response["items"]
+                if remaining:
+                    items = items[:remaining]
+                    remaining -= len(items)
+                for it in items:
                     yield it
-                if maxResults and count == maxResults:
-                    break
-                request = service.posts().list_next(request, response)
         except HttpError as he:
             if he.resp.status == 404:
                 return
             raise
 
+    # attributes passed to asciidoctor - part of the conversion cache key
+    asciidoctorArgs = ["-r", "asciidoctor-diagram",
+                       "-a", "stylesheet!",
+                       "-a", "allow-uri-read",
+                       "-a", "sectanchors",
+                       "-a", "sectnums",
+                       "-a", "last-update-label!",
+                       "-a", "experimental",
+                       "-a", "data-uri",
+                       "-a", "icons=font"]
+
+    # documents per asciidoctor process in prerender - keeps the command
+    # line within limits
+    asciidoctorBatchSize = 100
+
+    def _toolchain(self, fmt):
+        """What a conversion from fmt depends on besides its input"""
+        if fmt == "asciidoc":
+            return [binaryFingerprint("asciidoctor"), self.asciidoctorArgs]
+        return ["pandoc", getFormatCache().version()]
+
+    def _convertAsciidoc(self, raw):
+        logger.debug("using asciidoc")
+        with self.namedTemporaryFile(delete=False,
+                                     suffix=".adoc") as fp:
+            # print(type(raw))
+            if bytes == str:
+                # py2 - decode unicode to byte array
+                encodedBytes = raw.encode('utf8')
+            else:
+                encodedBytes = bytes(raw, 'utf8')
+            fp.write(encodedBytes)
+            fp.seek(0)
+            print(fp.name)
+            logger.debug("temp file: %s", fp.name)
+            htmlfile, ext = os.path.splitext(fp.name)
+            htmlfile = htmlfile + ".html"
+            logger.debug("Html file will be: %s", htmlfile)
+        try:
+            cmd = ["asciidoctor", "-v"] + self.asciidoctorArgs + [fp.name]
+            logger.debug("Running command: %s", " ".join(cmd))
+            if (os.name == "nt"):
+                self.check_output(cmd, shell=True)
+            else:
+                self.check_output(cmd)
+            return self.open(htmlfile).read()
+        except Exception as e:
+            print(e)
+            raise e
+
+    def _convertAsciidocBatch(self, sources):
+        """Converts many asciidoc documents with one asciidoctor process -
+        starting ruby and loading asciidoctor-diagram costs far more than
+        converting a post. Returns their html in the same order."""
+        tmpdir = mkdtemp(prefix="easyblogger-")
+        try:
+            names = []
+            for i, raw in enumerate(sources):
+                name = os.path.join(tmpdir, "post-%d.adoc" % i)
+                with io.open(name, "w", encoding="utf-8") as f:
+                    f.write(raw)
+                names.append(name)
+            cmd = ["asciidoctor", "-v"] + self.asciidoctorArgs + \
+                ["-D", tmpdir] + names
+            logger.debug("Running asciidoctor on %d documents", len(names))
+            self.check_output(cmd, shell=(os.name == "nt"))
+            htmls = []
+            for name in names:
+                with io.open(os.path.splitext(name)[0] + ".html",
+                             encoding="utf-8") as f:
+                    htmls.append(f.read())
+            return htmls
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def prerender(self, contents, fmt, filters=[]):
+        """Converts documents that will be posted later in one go (only
+        asciidoc benefits). _getMarkup then returns the prepared html."""
+        if fmt != "asciidoc":
+            return
+        pending = []
+        for raw in contents:
+            if (fmt, raw) in self._rendered or raw in pending:
+                continue
+            if self.conversionCache is not None:
+                key = conversionKey(raw, fmt, filters, self._toolchain(fmt))
+                if self.conversionCache.get(key) is not None:
+                    continue
+            pending.append(raw)
+        # counted here as they won't be looked up again - _getMarkup finds
+        # them in _rendered
+        inc("conversion_cache_total", len(pending), result="miss")
+        for i in range(0, len(pending), self.asciidoctorBatchSize):
+            chunk = pending[i:i + self.asciidoctorBatchSize]
+            with span("convert asciidoc batch", documents=len(chunk)), \
+                    timer("conversion_duration_seconds",
+                          backend="asciidoctor-batch"):
+                htmls = self._convertAsciidocBatch(chunk)
+            for raw, html in zip(chunk, htmls):
+                self._rendered[(fmt, raw)] = html
+                if self.conversionCache is not None:
+                    self.conversionCache.put(
+                        conversionKey(raw, fmt, filters,
+                                      self._toolchain(fmt)), html)
+
+    def _convert(self, raw, fmt, filters):
+        if self.converter is None and fmt != "asciidoc":
+            self.converter = getConverter()
+        backend = "asciidoctor" if fmt == "asciidoc" else \
+            getattr(self.converter, "backend", "pandoc")
+        with self.convertLimit, span("convert " + fmt), \
+                timer("conversion_duration_seconds", backend=backend):
+            if fmt == "asciidoc":
+                return self._convertAsciidoc(raw)
+            return self.converter.convert_text(
+                raw, 'html', format=fmt, filters=filters)
+
     def _getMarkup(self, content, fmt, filters):
         raw = content
         if hasattr(content, 'read'):
             raw = content.read()
-        html = raw
-        if fmt != "html":
-            if fmt == "asciidoc":
-                logger.debug("using asciidoc")
-                with self.namedTemporaryFile(delete=False,
-                                             suffix=".adoc") as fp:
-                    # print(type(raw))
-                    if bytes == str:
-                        # py2 - decode unicode to byte array
-                        encodedBytes = raw.encode('utf8')
-                    else:
-                        encodedBytes = bytes(raw, 'utf8')
-                    fp.write(encodedBytes)
-                    fp.seek(0)
-                    print(fp.name)
-                    logger.debug("temp file: %s", fp.name)
-                    htmlfile, ext = os.path.splitext(fp.name)
-                    htmlfile = htmlfile + ".html"
-                    logger.debug("Html file will be: %s", htmlfile)
-                try:
-                    cmd = ["asciidoctor",
-                           "-v",
-                           "-r",
-                           "asciidoctor-diagram",
-                           "-a", "stylesheet!",
-                           "-a", "allow-uri-read",
-                           "-a", "sectanchors",
-                           "-a", "sectnums",
-                           "-a", "last-update-label!",
-                           "-a", "experimental",
-                           "-a", "data-uri",
-                           "-a", "icons=font",
-                           fp.name]
-                    logger.debug("Running command: %s", " ".join(cmd))
-                    if (os.name == "nt"):
-                        self.check_output(cmd, shell=True)
-                    else:
-                        self.check_output(cmd)
-                    html = self.open(htmlfile).read()
-                except Exception as e:
-                    print(e)
-                    raise e
-            else:
-                html = self.converter.convert_text(
-                    raw, 'html', format=fmt, filters=filters)
+        if fmt == "html":
+            return raw
+        # prerendered html is only needed once - dropped so that a run
+        # doesn't keep every post it converted
+        html = self._rendered.pop((fmt, raw), None)
+        if html is not None:
+            return html
+        key = None
+        if self.conversionCache is not None:
+            try:
+                key = conversionKey(raw, fmt, filters, self._toolchain(fmt))
+            except Exception as e:
+                # can't tell which converter would run - don't cache
+                logger.debug("Not caching conversion: %s", e)
+            if key:
+                html = self.conversionCache.get(key)
+                inc("conversion_cache_total",
+                    result="miss" if html is None else "hit")
+                if html is not None:
+                    return html
+        html = self._convert(raw, fmt, filters)
+        if key:
+            self.conversionCache.put(key, html)
         # logger.debug("Converted text: %s", html)
         return html
 
+    def getMarkup(self, content, fmt="html", filters=[]):
+        """Converts content (text or a file like object) in the given format
+        to the html that would be published"""
+        return self._getMarkup(content, fmt, filters)
+
     def post(self, title, content, labels, filters=[], isDraft=True,
              fmt="html", publishDate=None):
         self._setBlog()
@@ -261,18 +648,62 @@ class EasyBlogger(object):
         req = service.posts().insert(blogId=self.blogId,
                                      body=blogPost,
                                      isDraft=isDraft)
-        return req.execute()
+        return self._execute(req, idempotent=False)
+
+    def getPostsById(self, postIds, batchSize=None, fields=None):
+        """Gets posts batchSize at a time. Yields (postId, post, error) for
+        each id - post is None if it wasn't found or on error"""
+        self._setBlog()
+        service = self._OAuth_Authenticate()
+        projection = self._projection(fields, self.POST_FIELDS)
+        kwargs = {"fields": projection} if projection else {}
+        requests = [(postId, service.posts().get(blogId=self.blogId,
+                                                 postId=postId,
+                                                 view="AUTHOR",
+                                                 **kwargs))
+                    for postId in postIds]
+        for postId, post, error in self._executeBatch(requests, batchSize):
+            if error is not None and error.resp.status == 404:
+                error = None
+            yield postId, post, error
+
+    def getPostStatuses(self, postIds, batchSize=None):
+        """Returns {postId: status} for the posts that exist. Lets
+        updatePost skip looking up the status of each post"""
+        statuses = {}
+        for postId, post, error in self.getPostsById(postIds, batchSize,
+                                                     fields="status"):
+            if post:
+                statuses[postId] = post["status"]
+            elif error:
+                logger.warning("Could not get status of %s: %s",
+                               postId, error)
+        return statuses
 
     def deletePost(self, postId):
         self._setBlog()
         service = self._OAuth_Authenticate()
         req = service.posts().delete(blogId=self.blogId, postId=postId)
-        return req.execute()
+        return self._execute(req)
+
+    def deletePosts(self, postIds, batchSize=None):
+        """Deletes posts batchSize at a time. Yields (postId, error) for each
+        id - error is None if the post was deleted"""
+        self._setBlog()
+        service = self._OAuth_Authenticate()
+        requests = [(postId, service.posts().delete(blogId=self.blogId,
+                                                    postId=postId))
+                    for postId in postIds]
+        for postId, resp, error in self._executeBatch(requests, batchSize):
+            yield postId, error
 
     def updatePost(self, postId, title=None, content=None, labels=None,
                    filters=[],
                    isDraft=True,
-                   fmt="html", publishDate=None):
+                   fmt="html", publishDate=None, postStatus=None):
+        """Updates a post. Pass postStatus (LIVE, DRAFT or SCHEDULED) if it's
+        known to save looking it up - a live or scheduled post is then
+        updated with a single request"""
         self._setBlog()
         service = self._OAuth_Authenticate()
         blogPost = {}
@@ -288,12 +719,13 @@ class EasyBlogger(object):
         blogPost['labels'] = EasyBlogger._parseLabels(labels)
 
         logger.debug("blogpost %s", labels)
-        postStatus = service.posts().get(
-            blogId=self.blogId,
-            postId=postId,
-            view="AUTHOR",
-            fields="status"
-        ).execute()['status']
+        if not postStatus:
+            postStatus = self._execute(service.posts().get(
+                blogId=self.blogId,
+                postId=postId,
+                view="AUTHOR",
+                fields="status"
+            ))['status']
         mustPublish = postStatus == 'DRAFT' and not isDraft
         logger.debug(
             "must publish (postStatus(%s) == 'DRAFT' and not isDraft(%s)): %s"
@@ -302,30 +734,39 @@ class EasyBlogger(object):
         # publish the post since we cannot update a draft directly
         newStatus = ""
         if postStatus == "DRAFT":
-            newStatus = service.posts().publish(blogId=self.blogId,
-                                                postId=postId, fields="status").execute()['status']
+            newStatus = self._execute(service.posts().publish(
+                blogId=self.blogId, postId=postId, fields="status"),
+                idempotent=False)['status']
             logger.debug("newStatus: %s", newStatus)
         if postStatus == 'LIVE' or newStatus == 'LIVE':
-            resp = service.posts().patch(
+            resp = self._execute(service.posts().patch(
                 blogId=self.blogId,
                 postId=postId,
                 body=blogPost,
                 revert=isDraft,
-                publish=mustPublish).execute()
+                publish=mustPublish))
             return resp
         elif postStatus == 'SCHEDULED' or newStatus == 'SCHEDULED':
-            resp = service.posts().update(
+            # update replaces the whole post - keep what isn't changing (a
+            # file whose frontmatter alone changed has no content here)
+            missing = [k for k in ("title", "content") if k not in blogPost]
+            if missing:
+                current = self._execute(service.posts().get(
+                    blogId=self.blogId,
+                    postId=postId,
+                    view="AUTHOR",
+                    fields=",".join(missing)))
+                for k in missing:
+                    if k in current:
+                        blogPost[k] = current[k]
+            resp = self._execute(service.posts().update(
                 blogId=self.blogId,
                 postId=postId,
-                body=blogPost).execute()
+                body=blogPost))
             return resp
 
 
 class ContentArgParser(object):
-    reToml = re.compile(r"^\+\+\+\s*$(.*?)^\+\+\+\s*$(.*)",
-                        re.MULTILINE | re.DOTALL)
-    reYaml = re.compile(r"^\s*((<!--)|(////))\s*$(.*?)^\s*((-->)|(////))\s*$(.*)",
-                        re.MULTILINE | re.DOTALL)
 
     def __init__(self, theFile, open=open):
         self.theFile = theFile
@@ -339,29 +780,44 @@ class ContentArgParser(object):
         self.title = None
         self.labels = ["untagged"]
         self.publishDate = None
+        self._frontmatter = None
+        self._content = None
+
+    @property
+    def content(self):
+        """The document without its frontmatter - sliced out of it on first
+        use"""
+        if self._content is None:
+            if self._frontmatter is None:
+                raise AttributeError("content")
+            self._content = self._frontmatter.body
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
 
     def _inferArgsFromContent(self):
+        import toml
         fileContent = self.theFile.read()
 
-        isToml = ContentArgParser.reToml.findall(fileContent)
-        isYaml = ContentArgParser.reYaml.findall(fileContent)
+        found = scanFrontmatter(fileContent)
         frontmatter = {}
-        if isToml:
-            frontmatter = toml.loads(isToml[0][0])
+        if found is None:
+            raise Exception('Unknown frontmatter format %s' % fileContent)
+        self._frontmatter = found
+        if found.format == 'toml':
+            frontmatter = toml.loads(found.text)
             print(frontmatter)
             logger.debug("Found toml frontmatter %s", frontmatter)
-            self.content = isToml[0][-1]
             self.frontmatterFormat = 'toml'
-        elif isYaml:
-            frontmatter = yaml.load(isYaml[0][3], Loader=yaml.FullLoader)
-            self.useHtmlComment = isYaml[0][0] == '<!--'
-            self.content = isYaml[0][-1]
+        else:
+            frontmatter = loadYaml(found.text)
+            self.useHtmlComment = found.opener == '<!--'
             self.frontmatterFormat = 'yaml'
             self.format = "markdown"
             if not frontmatter:
                 frontmatter = {}
-        else:
-            raise Exception('Unknown frontmatter format %s' % fileContent)
         self.frontMatter = frontmatter
 
         logger.debug("Parsed frontmatter: %s", self.frontMatter)
@@ -441,30 +897,7 @@ class ContentArgParser(object):
     def updateFileWithPostId(self, postId):
         if self.theFile == sys.stdin:
             return
-        if not hasattr(self, "content"):
-            self.content = self.theFile.read()
-        if self.legacyKeys:
-            self.frontMatter['PostId'] = postId
-        else:
-            self.frontMatter['id'] = postId
-
-        with self.open(self.theFile.name, "w", encoding='utf-8') as f:
-            if self.frontmatterFormat == 'toml':
-                f.write("""+++
-%s
-+++
-%s
-""" % (toml.dumps(self.frontMatter), self.content))
-            elif self.useHtmlComment:
-                f.write("""<!--
-%s
--->
-%s
-""" % (yaml.dump(self.frontMatter, allow_unicode=True), self.content))
-            else:
-                f.write("""////
-%s
-////
-%s
-""" % (yaml.dump(self.frontMatter, allow_unicode=True), self.content))
-            f.flush()
+        key = 'PostId' if self.legacyKeys else 'id'
+        # only the frontmatter is rewritten - the body is copied as it is
+        self.frontMatter = rewriteFrontmatter(self.theFile.name,
+                                              {key: postId})
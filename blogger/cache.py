@@ -0,0 +1,136 @@
+import errno
+import hashlib
+import io
+import json
+import logging
+import os
+import os.path
+try:
+    from shutil import which
+except ImportError:
+    # py2
+    from distutils.spawn import find_executable as which
+
+from .util import atomicWrite, cacheDir
+logger = logging.getLogger(__name__)
+
+
+def _fileSha(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def filterFingerprint(name):
+    """A pandoc filter as it would be run - its path and a hash of the script
+    so that editing a filter invalidates what it rendered"""
+    path = name if os.path.isfile(name) else which(name)
+    if not path:
+        return [name, None]
+    try:
+        return [name, _fileSha(path)]
+    except (IOError, OSError):
+        return [name, None]
+
+
+def binaryFingerprint(name):
+    """path and mtime of an executable on PATH - changes when it's upgraded"""
+    path = which(name)
+    if not path:
+        return [name, None]
+    try:
+        return [path, os.path.getmtime(path)]
+    except OSError:
+        return [path, None]
+
+
+def conversionKey(raw, fmt, filters, toolchain):
+    """Cache key for rendering raw (text or bytes) from fmt to html with the
+    given filters and converter - see filterFingerprint, binaryFingerprint"""
+    if not isinstance(raw, bytes):
+        raw = raw.encode("utf-8")
+    sha = hashlib.sha1(raw)
+    sha.update(json.dumps([fmt,
+                           [filterFingerprint(f) for f in filters or []],
+                           toolchain],
+                          sort_keys=True, default=str).encode("utf-8"))
+    return sha.hexdigest()
+
+
+class ConversionCache(object):
+    """On disk cache of rendered html, one file per conversion named by its
+    key (see conversionKey). The least recently used entries are dropped once
+    the cache grows past maxBytes."""
+
+    maxBytes = 64 * 1024 * 1024
+
+    def __init__(self, path=None, maxBytes=None):
+        self.path = path or os.path.join(cacheDir(), "conversions")
+        if maxBytes is not None:
+            self.maxBytes = maxBytes
+        self.size = None
+        try:
+            os.makedirs(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _entry(self, key):
+        return os.path.join(self.path, key + ".html")
+
+    def _entries(self):
+        for name in os.listdir(self.path):
+            if not name.endswith(".html"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+    def get(self, key):
+        entry = self._entry(key)
+        try:
+            with io.open(entry, "r", encoding="utf-8") as f:
+                html = f.read()
+        except (IOError, OSError):
+            return None
+        try:
+            # mark as recently used
+            os.utime(entry, None)
+        except OSError:
+            pass
+        logger.debug("Conversion cache hit: %s", key)
+        return html
+
+    def put(self, key, html):
+        data = html.encode("utf-8")
+        try:
+            atomicWrite(self._entry(key), data)
+        except (IOError, OSError) as e:
+            logger.warning("Could not save conversion %s: %s", key, e)
+            return
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self._entries())
+        else:
+            self.size += len(data)
+        if self.size > self.maxBytes:
+            self.evict()
+
+    def evict(self):
+        """Drops the least recently used entries till the cache is under
+        maxBytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.size = total
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import os.path
+import time
+
+from .util import atomicWrite, cacheDir
+logger = logging.getLogger(__name__)
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/blogger/v3/rest"
+# how long a local copy of the discovery document is used before trying to
+# refresh it
+DISCOVERY_TTL = 7 * 24 * 3600
+
+_documents = {}
+
+
+def _bundledDocument():
+    """The copy of the discovery document shipped with google-api-python-client
+    (2.x and later) or None."""
+    try:
+        from googleapiclient import discovery_cache
+        return discovery_cache.get_static_doc("blogger", "v3")
+    except (ImportError, AttributeError):
+        return None
+
+
+def _fetchDocument(http):
+    if http is None:
+        import httplib2
+        http = httplib2.Http(timeout=10)
+    resp, content = http.request(DISCOVERY_URL)
+    if resp.status != 200:
+        raise IOError("Fetching %s failed with status %s" %
+                      (DISCOVERY_URL, resp.status))
+    if not isinstance(content, str):
+        content = content.decode("utf-8")
+    # don't persist anything that isn't a discovery document
+    json.loads(content)
+    return content
+
+
+def _read(cacheFile):
+    with open(cacheFile, "r") as f:
+        return f.read()
+
+
+def _write(cacheFile, content):
+    try:
+        atomicWrite(cacheFile, content.encode("utf-8"))
+    except (IOError, OSError) as e:
+        logger.warning("Could not save discovery document %s: %s",
+                       cacheFile, e)
+
+
+def getDiscoveryDocument(http=None, cacheFile=None, ttl=DISCOVERY_TTL):
+    """Returns the Blogger v3 discovery document as a dict.
+
+    A local copy is kept in the cache dir so that no process has to fetch it
+    before making its first API call. It is seeded from the copy bundled with
+    the api client if there is one (so the client works offline), refreshed
+    from the network once it is older than ``ttl`` seconds and kept as is when
+    that fails.
+    """
+    cacheFile = cacheFile or os.path.join(cacheDir(), "blogger-v3.json")
+    if cacheFile in _documents:
+        return _documents[cacheFile]
+    content = None
+    try:
+        age = time.time() - os.path.getmtime(cacheFile)
+        content = _read(cacheFile)
+    except (IOError, OSError):
+        age = None
+
+    if content is None:
+        content = _bundledDocument()
+        if content is not None:
+            logger.debug("Seeding discovery document from bundled copy")
+            _write(cacheFile, content)
+            age = 0
+    if content is None or age > ttl:
+        try:
+            logger.debug("Fetching discovery document: %s", DISCOVERY_URL)
+            content = _fetchDocument(http)
+            _write(cacheFile, content)
+        except Exception as e:
+            if content is None:
+                raise
+            logger.warning("Could not refresh discovery document, using "
+                           "local copy: %s", e)
+            # don't try again on every run while offline
+            try:
+                os.utime(cacheFile, None)
+            except OSError:
+                pass
+    _documents[cacheFile] = json.loads(content)
+    return _documents[cacheFile]
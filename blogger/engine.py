@@ -0,0 +1,109 @@
+import logging
+logger = logging.getLogger(__name__)
+
+# marks the end of a map's work queue
+_DONE = object()
+
+
+class NoLimit(object):
+    """Stands in for a semaphore when there's nothing to limit"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_LIMIT = NoLimit()
+
+
+class SerialEngine(object):
+    """Runs jobs one after the other in the calling thread."""
+
+    name = "serial"
+
+    def spawn(self, fn, *args, **kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            # match gevent - a failing job is reported but doesn't stop the
+            # others
+            logger.exception("Job %s failed", fn.__name__)
+
+    def wait(self, jobs):
+        pass
+
+    def map(self, fn, items, workers):
+        for item in items:
+            self.spawn(fn, item)
+
+    def semaphore(self, size):
+        # jobs never overlap
+        return NO_LIMIT
+
+
+class GeventEngine(object):
+    """Runs jobs concurrently on greenlets.
+
+    gevent's monkey patching is only applied when this engine is created so
+    that commands which don't need concurrency never pay for it.
+    """
+
+    name = "gevent"
+
+    def __init__(self):
+        from gevent import monkey
+        monkey.patch_all()
+        import gevent
+        self.gevent = gevent
+
+    def spawn(self, fn, *args, **kwargs):
+        return self.gevent.spawn(fn, *args, **kwargs)
+
+    def wait(self, jobs):
+        self.gevent.wait([j for j in jobs if j is not None])
+
+    def map(self, fn, items, workers):
+        """Calls fn on each of items with at most workers running at a time.
+        items are queued as workers free up, so a long (or lazy) list of items
+        doesn't mean as many greenlets or items in memory."""
+        from gevent.queue import Queue
+        workers = max(1, workers or 1)
+        queue = Queue(maxsize=workers)
+
+        def worker():
+            while True:
+                item = queue.get()
+                if item is _DONE:
+                    return
+                try:
+                    fn(item)
+                except Exception:
+                    logger.exception("Job %s failed", fn.__name__)
+        jobs = [self.spawn(worker) for i in range(workers)]
+        try:
+            for item in items:
+                queue.put(item)
+        finally:
+            # even if items failed - the jobs already queued are finished
+            # before it's raised
+            for job in jobs:
+                queue.put(_DONE)
+            self.wait(jobs)
+
+    def semaphore(self, size):
+        if not size:
+            return NO_LIMIT
+        from gevent.lock import BoundedSemaphore
+        return BoundedSemaphore(size)
+
+
+ENGINES = {"gevent": GeventEngine, "serial": SerialEngine}
+_engines = {}
+
+
+def getEngine(name="gevent"):
+    if name not in _engines:
+        _engines[name] = ENGINES[name]()
+    return _engines[name]
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import os.path
+try:
+    from shutil import which
+except ImportError:
+    # py2
+    from distutils.spawn import find_executable as which
+
+from .util import atomicWrite, cacheDir
+logger = logging.getLogger(__name__)
+
+
+class FormatCache(object):
+    """Persistent cache of the input/output formats supported by pandoc.
+
+    Probing pandoc forks it (twice), so the lists are kept on disk keyed by
+    the pandoc binary's path and mtime along with the version that produced
+    them. Pandoc is only probed when the cache is missing or stale.
+    """
+
+    def __init__(self, cacheFile=None, converter=None):
+        self.cacheFile = cacheFile
+        self.converter = converter
+        self.entry = None
+
+    def _converter(self):
+        if self.converter is None:
+            import pypandoc
+            self.converter = pypandoc
+        return self.converter
+
+    def _pandocBinary(self):
+        path = os.environ.get("PYPANDOC_PANDOC") or which("pandoc")
+        if not path:
+            # pandoc isn't on PATH - let pypandoc look in its usual places
+            path = self._converter().get_pandoc_path()
+        path = os.path.abspath(os.path.expanduser(path))
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        return path, mtime
+
+    def _load(self, cacheFile):
+        try:
+            with open(cacheFile, "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _probe(self, path, mtime, cacheFile):
+        converter = self._converter()
+        logger.debug("Probing pandoc formats: %s", path)
+        inputFormats, outputFormats = converter.get_pandoc_formats()
+        entry = {"path": path,
+                 "mtime": mtime,
+                 "version": converter.get_pandoc_version(),
+                 "input": list(inputFormats),
+                 "output": list(outputFormats)}
+        try:
+            atomicWrite(cacheFile, json.dumps(entry).encode("utf-8"))
+        except (IOError, OSError) as e:
+            logger.warning("Could not write pandoc format cache %s: %s",
+                           cacheFile, e)
+        return entry
+
+    def _getEntry(self):
+        if self.entry:
+            return self.entry
+        cacheFile = self.cacheFile or \
+            os.path.join(cacheDir(), "pandoc-formats.json")
+        path, mtime = self._pandocBinary()
+        entry = self._load(cacheFile)
+        if not entry or mtime is None or \
+                entry.get("path") != path or entry.get("mtime") != mtime:
+            entry = self._probe(path, mtime, cacheFile)
+        else:
+            logger.debug("Using cached pandoc formats for %s (%s)",
+                         path, entry.get("version"))
+        self.entry = entry
+        return entry
+
+    def inputFormats(self):
+        return self._getEntry()["input"]
+
+    def outputFormats(self):
+        return self._getEntry()["output"]
+
+    def version(self):
+        return self._getEntry()["version"]
+
+
+_formatCache = None
+
+
+def getFormatCache():
+    global _formatCache
+    if _formatCache is None:
+        _formatCache = FormatCache()
+    return _formatCache
@@ -0,0 +1,196 @@
+import io
+import re
+import shutil
+
+from .util import atomicWriter
+
+# whitespace run - used to find where a body starts without copying it
+_SPACE = re.compile(r"\s*")
+
+TOML_DELIMITER = "+++"
+YAML_OPENERS = ("<!--", "////")
+YAML_CLOSERS = ("-->", "////")
+
+
+class Frontmatter(object):
+    """The frontmatter block at the top of a document.
+
+    format is toml or yaml, text what's between the delimiters and opener the
+    opening delimiter (+++, <!-- or ////). The body - everything after the
+    block - is only sliced out of the document when it's asked for.
+    """
+
+    def __init__(self, format, text, opener, document, bodyStart):
+        self.format = format
+        self.text = text
+        self.opener = opener
+        self._document = document
+        self._bodyStart = bodyStart
+        self._body = None
+
+    @property
+    def body(self):
+        # as the regular expressions this replaces had it: the body starts
+        # with the line break before its first non blank line (blank lines
+        # right after the block are dropped), and is empty if it's all blank
+        if self._body is None:
+            document, start = self._document, self._bodyStart
+            text = _SPACE.match(document, start).end()
+            if text == len(document):
+                self._body = document[:0]
+            else:
+                self._body = document[document.rfind("\n", start, text):]
+            self._document = None
+        return self._body
+
+
+def _lines(document):
+    """(start, end, line) of each line of document - line without its line
+    break"""
+    start, size = 0, len(document)
+    while start < size:
+        end = document.find("\n", start)
+        if end == -1:
+            end = size
+        yield start, end, document[start:end]
+        start = end + 1
+
+
+def _fileLines(f):
+    """_lines of a file opened in binary mode - offsets are in bytes, and
+    lines end before a \\r\\n line break"""
+    offset = 0
+    for raw in iter(f.readline, b""):
+        line = raw.rstrip(b"\r\n")
+        yield offset, offset + len(line), line.decode("utf-8")
+        offset += len(raw)
+
+
+def _isToml(line):
+    return line.startswith(TOML_DELIMITER) and \
+        not line[len(TOML_DELIMITER):].strip()
+
+
+def _isYamlCloser(line):
+    return line.strip() in YAML_CLOSERS
+
+
+def _block(lines):
+    """Finds the frontmatter block in lines (see _lines), reading no further
+    than its closing delimiter. Returns (format, opener, end of the opening
+    line, start of the closing line, end of the closing line) or None."""
+    for start, end, opener in lines:
+        if opener.strip():
+            break
+    else:
+        return None
+    if _isToml(opener):
+        fmt, isCloser = "toml", _isToml
+    elif opener.strip() in YAML_OPENERS:
+        fmt, isCloser = "yaml", _isYamlCloser
+    else:
+        return None
+    textStart = end
+    for start, end, line in lines:
+        if isCloser(line):
+            return fmt, opener.strip(), textStart, start, end
+    return None
+
+
+def scan(document):
+    """Finds the frontmatter of a document (text) - toml between +++ lines,
+    or yaml in an html (<!-- -->) or asciidoc (////) comment. Which it is
+    comes from the first non blank line, and only the lines up to the
+    closing delimiter are looked at.
+
+    Returns a Frontmatter, or None if the document doesn't start with one.
+    """
+    found = _block(_lines(document))
+    if found is None:
+        return None
+    fmt, opener, textStart, closerStart, closerEnd = found
+    return Frontmatter(fmt, document[textStart:closerStart], opener,
+                       document, closerEnd)
+
+
+# characters libyaml writes differently than pyyaml's own emitter does -
+# escapes (line breaks, tabs, control characters) are folded differently in
+# long double quoted strings and it escapes characters beyond the bmp
+_EMITTED_DIFFERENTLY = re.compile(u"[^\x20-\x7e\xa0-\ud7ff\ue000-\ufffd]")
+
+
+def _libyamlSafe(data):
+    if isinstance(data, dict):
+        return all(_libyamlSafe(k) and _libyamlSafe(v)
+                   for k, v in data.items())
+    if isinstance(data, (list, tuple)):
+        return all(_libyamlSafe(v) for v in data)
+    if isinstance(data, type(u"")):
+        return _EMITTED_DIFFERENTLY.search(data) is None
+    return True
+
+
+def loadYaml(text):
+    """Parses yaml frontmatter - with libyaml if pyyaml was built with it"""
+    import yaml
+    return yaml.load(text, Loader=getattr(yaml, "CSafeLoader",
+                                          yaml.SafeLoader))
+
+
+def dumpYaml(data):
+    """Writes yaml frontmatter - with libyaml if pyyaml was built with it,
+    unless libyaml would write it differently than pyyaml does, so the
+    output is the same either way"""
+    import yaml
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    if dumper is not yaml.SafeDumper and not _libyamlSafe(data):
+        dumper = yaml.SafeDumper
+    return yaml.dump(data, Dumper=dumper, allow_unicode=True)
+
+
+CLOSERS = {"+++": "+++", "<!--": "-->", "////": "////"}
+
+
+def _parse(fmt, text):
+    if fmt == "toml":
+        import toml
+        return toml.loads(text)
+    return loadYaml(text) or {}
+
+
+def _header(fmt, opener, data, newline):
+    if fmt == "toml":
+        import toml
+        text = toml.dumps(data)
+    else:
+        text = dumpYaml(data)
+    header = u"%s\n%s\n%s" % (opener, text, CLOSERS[opener])
+    return header.replace(u"\n", newline)
+
+
+def rewrite(filename, fields):
+    """Sets fields (a dict) in the frontmatter of a utf-8 file, ex:
+
+        rewrite("post.md", {"id": "1234"})
+
+    Only the frontmatter is written anew - the rest of the file is copied
+    over byte for byte, without being decoded - and the file is replaced
+    with a rename, so it's never left half written. Returns the updated
+    frontmatter; raises ValueError if the file has none.
+    """
+    with atomicWriter(filename) as out:
+        with io.open(filename, "rb") as f:
+            found = _block(_fileLines(f))
+            if found is None:
+                raise ValueError("%s has no frontmatter" % filename)
+            fmt, opener, textStart, closerStart, closerEnd = found
+            f.seek(textStart)
+            text = f.read(closerStart - textStart)
+            # keep to the file's line breaks
+            newline = u"\r\n" if text.startswith(b"\r\n") else u"\n"
+            data = _parse(fmt, text.decode("utf-8"))
+            data.update(fields)
+            out.write(_header(fmt, opener, data, newline).encode("utf-8"))
+            f.seek(closerEnd)
+            shutil.copyfileobj(f, out)
+    return data
@@ -1,20 +1,23 @@
 import sys
 import logging
-import coloredlogs
 import argparse
 import os
 import json
-import pypandoc
-import toml
-import yaml
-import gevent
-import copy
 import glob
-import chardet
+import re
 
-from gevent import monkey
-from oauth2client.client import AccessTokenRefreshError
 from .blogger import ContentArgParser, EasyBlogger
+from .cache import ConversionCache
+from .engine import ENGINES, getEngine
+from .formats import getFormatCache
+from .frontmatter import dumpYaml
+from .manifest import Manifest, contentHash, fileHashes
+from .metrics import inc, stopMetrics, useMetrics
+from .output import FORMATS as OUTPUT_FORMATS, RowWriter
+from .pandocserver import getConverter, usePandocServers
+from .ratelimit import getRateLimiter, useRateLimiter
+from .trace import span, stopTracing, useTracer
+from .util import atomicWrite
 from io import open
 try:
     from urllib.parse import urlparse
@@ -37,13 +40,13 @@ else:
     bytes = str
     basestring = basestring
 
-monkey.patch_all()
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
 
 def toUnicode(s):
     if py2:
+        import chardet
         enc = chardet.detect(s)['encoding']
         return s.decode(enc).encode('utf8')
     else:
@@ -57,6 +60,7 @@ def getFilenameFromPostUrl(url, format):
 
 
 def getFrontMatter(item, docFormat, legacy=False, bare=False):
+    import toml
     frontmatter = dict()
     if legacy:
         frontmatter["Title"] = item["title"]
@@ -79,7 +83,7 @@ def getFrontMatter(item, docFormat, legacy=False, bare=False):
         if docFormat == "asciidoc":
             return toml.dumps(frontmatter)
         else:
-            return yaml.dump(frontmatter)
+            return dumpYaml(frontmatter)
     if docFormat == "asciidoc":
         return u"""+++
 %s
@@ -87,7 +91,7 @@ def getFrontMatter(item, docFormat, legacy=False, bare=False):
     else:
         return u"""<!--
 %s
--->""" % yaml.dump(frontmatter)
+-->""" % dumpYaml(frontmatter)
 
 
 def printPosts(item, fields, docFormat=None, writeToFiles=False,
@@ -96,27 +100,27 @@ def printPosts(item, fields, docFormat=None, writeToFiles=False,
 {0}
 {1}
 """
-    logger.debug(json.dumps(item,
-                            sort_keys=True,
-                            indent=2,
-                            separators=(',', ': ')))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps(item,
+                                sort_keys=True,
+                                indent=2,
+                                separators=(',', ': ')))
     if docFormat:
         logger.debug("Starting to print %s", item['id'])
         filename = None
         content = item["content"].encode('utf-8', "ignore")
         if writeToFiles:
             filename = getFilenameFromPostUrl(item['url'], docFormat)
-            with open(filename, "wb") as outputFile:
-                outputFile.write(content)
-            converted = pypandoc.convert_file(
-                filename,
+            # convert in memory and write the file once - a failed export
+            # leaves no html behind under the document's name
+            converted = getConverter().convert_text(
+                item["content"],
                 docFormat,
                 format="html")
             content = template.format(getFrontMatter(item, docFormat, legacyFrontmatter),
                                       converted).encode('utf-8',
                                                         errors='replace')
-            with open(filename, "wb") as outputfile:
-                outputfile.write(content)
+            atomicWrite(filename, content)
         else:
             print(content)
         logger.info("Finished print %s: %s", item['id'], filename)
@@ -126,8 +130,40 @@ def printPosts(item, fields, docFormat=None, writeToFiles=False,
         print(",".join(line))
 
 
+def _pandocFormat(fmt, getSupported):
+    try:
+        supported = getSupported()
+    except OSError as e:
+        raise argparse.ArgumentTypeError(
+            "format %r needs pandoc: %s" % (fmt, e))
+    # pandoc accepts extensions on the format name (markdown+smart etc)
+    if re.split(r"[+-]", fmt)[0] not in supported:
+        raise argparse.ArgumentTypeError(
+            "invalid choice: %r (choose from %s)" % (fmt, ", ".join(supported)))
+    return fmt
+
+
+def inputFormat(fmt):
+    # html is used as-is and asciidoc goes to asciidoctor - neither needs
+    # pandoc, so don't probe it for them
+    if fmt in ("html", "asciidoc"):
+        return fmt
+    return _pandocFormat(fmt, getFormatCache().inputFormats)
+
+
+def outputFormat(fmt):
+    return _pandocFormat(fmt, getFormatCache().outputFormats)
+
+
+def _cpuCount():
+    try:
+        return os.cpu_count() or 2
+    except AttributeError:
+        # py2
+        return 2
+
+
 def parse_args(sysargv):
-    pandocInputFormats, pandocOutputFormats = pypandoc.get_pandoc_formats()
     parser = argparse.ArgumentParser(
         prog='easyblogger',
         description="Easily manage posts on Blogger blogs",
@@ -149,6 +185,91 @@ def parse_args(sysargv):
         choices=["INFO", "DEBUG", "WARNING", "ERROR", "CRITICAL"],
         type=str.upper,
         default="CRITICAL")
+    parser.add_argument(
+        "--engine",
+        help="how to run multi post commands (file, get) - " +
+        "default gevent",
+        choices=sorted(ENGINES),
+        default="gevent")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="max concurrent api requests (file) - default 4")
+    parser.add_argument(
+        "--convert-jobs",
+        dest="convertJobs",
+        type=int,
+        default=_cpuCount(),
+        help="max concurrent pandoc/asciidoctor conversions (file, get " +
+        "--doc) - default: number of cpus")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="max api requests per second (a batch counts each request " +
+        "in it) - default: no limit")
+    parser.add_argument(
+        "--daily-quota",
+        dest="dailyQuota",
+        type=int,
+        help="stop making api requests once this many have been made " +
+        "today (counted across runs)")
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="times to retry api requests that were rate limited or hit " +
+        "a server error - default 5")
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="write how long each stage took (oauth, discovery, api " +
+        "calls, conversions...) as a chrome trace (chrome://tracing)")
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print p50/p95/max time of each stage at exit")
+    parser.add_argument(
+        "--metrics-file",
+        dest="metricsFile",
+        metavar="FILE",
+        help="write api, conversion, cache and post counts and latencies " +
+        "at exit - as json if FILE ends in .json, else in prometheus " +
+        "text format (for node-exporter's textfile collector)")
+    parser.add_argument(
+        "--api-endpoint",
+        dest="apiEndpoint",
+        help="Blogger API root url - to use a local server, ex: " +
+        "http://localhost:8080/")
+    parser.add_argument(
+        "--batch-size",
+        dest="batchSize",
+        type=int,
+        help="max requests per http call when getting or deleting many " +
+        "posts by id (default: 50)")
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        metavar="PAGES",
+        help="pages of posts to fetch ahead while the current one is " +
+        "processed (get, sync) - default 2, 0 to turn off")
+    parser.add_argument(
+        "--pandoc-servers",
+        dest="pandocServers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="convert with N long running 'pandoc server' processes " +
+        "instead of starting pandoc per document (needs pandoc 3)")
+    parser.add_argument(
+        "--no-cache",
+        dest="conversionCache",
+        action="store_false",
+        help="always run pandoc/asciidoctor - don't reuse html rendered " +
+        "earlier for the same input")
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--blogid", help="Your blog id")
     group.add_argument("--url", help="Your blog url")
@@ -168,7 +289,8 @@ def parse_args(sysargv):
         help="The body content of posts will not be included. Use it when the post bodies are not required, to help minimize traffic.",
         action="store_true")
     group = get_parser.add_mutually_exclusive_group()
-    group.add_argument("-p", "--postId", help="the post id")
+    group.add_argument("-p", "--postId", nargs="+",
+                       help="the post id(s)")
     group.add_argument("-l", "--labels", help="comma separated list of labels",
                        type=toUnicode)
     group.add_argument("-q", "--query", help="search term", type=toUnicode)
@@ -182,8 +304,9 @@ def parse_args(sysargv):
         default="id,title,url")
     output_format.add_argument(
         "-d", "--doc",
+        type=outputFormat,
         help="""Output as document - use one of the output
-        formats supported by pandoc: """ + ", ".join(pandocOutputFormats))
+        formats supported by pandoc (pandoc --list-output-formats)""")
     get_parser.add_argument(
         "-w", "--write-files", dest='tofiles',
         help="write output files (only used with --doc). " +
@@ -198,6 +321,16 @@ def parse_args(sysargv):
         "--count",
         type=int,
         help="count")
+    get_parser.add_argument(
+        "-o", "--output",
+        choices=OUTPUT_FORMATS,
+        help="write the fields (-f) of each post as ndjson, csv or tsv " +
+        "rows instead of comma separated values")
+    get_parser.add_argument(
+        "-m", "--mirror",
+        action="store_true",
+        help="answer from the local mirror (see sync) instead of the api - " +
+        "works with -p, -l, -u and -c")
 
     post_parser = subparsers.add_parser("post", help="create a new post")
     post_parser.add_argument("-t", "--title", help="Post title",
@@ -230,11 +363,26 @@ def parse_args(sysargv):
         help="pandoc filters")
     post_parser.add_argument(
         "--format",
-        help="Content format: " + ", ".join(pandocInputFormats),
-        choices=pandocInputFormats,
+        help="Content format: html, asciidoc or any pandoc input format " +
+        "(pandoc --list-input-formats)",
+        type=inputFormat,
         default="html")
+    sync_parser = subparsers.add_parser(
+        "sync",
+        help="update the local mirror of the blog's posts")
+    sync_parser.add_argument(
+        "--bodies",
+        action="store_true",
+        help="store post bodies too (needed for get --mirror --doc)")
+    sync_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="fetch all posts, not just those updated since the last " +
+        "sync, and drop deleted posts")
+
     delete_parser = subparsers.add_parser("delete", help="delete a post")
-    delete_parser.add_argument("postIds", nargs="+", help="the post to delete")
+    delete_parser.add_argument("postIds", nargs="+",
+                               help="the post(s) to delete")
 
     update_parser = subparsers.add_parser("update", help="update a post")
     update_parser.add_argument("postId", help="the post to update")
@@ -252,8 +400,9 @@ def parse_args(sysargv):
 
     update_parser.add_argument(
         "--format",
-        help="Content format: " + ", ".join(pandocInputFormats),
-        choices=pandocInputFormats,
+        help="Content format: html, asciidoc or any pandoc input format " +
+        "(pandoc --list-input-formats)",
+        type=inputFormat,
         default="html")
 
     update_parser.add_argument(
@@ -278,6 +427,11 @@ def parse_args(sysargv):
         "file",
         nargs="+",
         help="Post content - input file")
+    file_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="publish all files, even those that haven't changed since " +
+        "they were last published")
 
     config = os.path.expanduser("~/.easyblogger")
     if (os.path.exists(config)):
@@ -285,8 +439,12 @@ def parse_args(sysargv):
     args = parser.parse_args(sysargv)
     verbosity = logging.getLevelName(args.verbose)
     # print(verbosity, logging.getLevelName(verbosity))
-    coloredlogs.install(verbosity)
-    if args.verbose != "critical":
+    if verbosity < logging.CRITICAL:
+        # coloredlogs is slow to import - skip it when (almost) nothing
+        # will be logged
+        import coloredlogs
+        coloredlogs.install(verbosity)
+    if args.verbose != "CRITICAL":
         logger.setLevel(logging.INFO)
         logger.info("setting log level to: %s ", args.verbose)
     logger.setLevel(verbosity)
@@ -299,68 +457,271 @@ def parse_args(sysargv):
 
 def main(sysargv=sys.argv):
     args = parse_args(sysargv[1:])
-    return runner(args)
+    usePandocServers(args.pandocServers)
+    limiter = useRateLimiter(args.rate, dailyQuota=args.dailyQuota,
+                             retries=args.retries)
+    tracer = useTracer() if args.trace or args.timings else None
+    metrics = useMetrics() if args.metricsFile else None
+    result = None
+    try:
+        result = runner(args)
+        return result
+    finally:
+        limiter.finish()
+        if tracer:
+            _finishTrace(args, tracer)
+        if metrics:
+            _finishMetrics(args, metrics, limiter, result == 0)
+
+
+def _finishTrace(args, tracer):
+    stopTracing()
+    if args.trace:
+        try:
+            tracer.write(args.trace)
+        except (IOError, OSError) as e:
+            logger.error("Could not write trace %s: %s", args.trace, e)
+    if args.timings:
+        sys.stderr.write(tracer.summary() + "\n")
+
+
+def _finishMetrics(args, metrics, limiter, success):
+    stopMetrics()
+    metrics.inc("ratelimit_throttled_total", limiter.stats["throttled"])
+    metrics.inc("ratelimit_retries_total", limiter.stats["retries"])
+    if limiter.dailyQuota and limiter.used is not None:
+        metrics.set("quota_used", limiter.used)
+    metrics.finish(success)
+    try:
+        metrics.write(args.metricsFile)
+    except (IOError, OSError) as e:
+        logger.error("Could not write metrics %s: %s", args.metricsFile, e)
+
+
+def newBlogger(args):
+    blogger = EasyBlogger(args.clientid, args.secret, args.blogid, args.url,
+                          apiEndpoint=args.apiEndpoint)
+    if args.conversionCache:
+        blogger.conversionCache = ConversionCache()
+    blogger.limiter = getRateLimiter()
+    blogger.prefetchPages = args.prefetch
+    blogger.httpPoolSize = args.jobs
+    return blogger
+
+
+def _printAll(args, posts):
+    if args.output and not args.doc:
+        writer = RowWriter(args.output, args.fields.split(","))
+        for item in posts:
+            writer.write(item)
+        writer.close()
+        return
+    # only document conversion benefits from running concurrently
+    engine = getEngine(args.engine if args.doc else "serial")
+
+    def printPost(item):
+        printPosts(item, args.fields, args.doc, args.tofiles,
+                   args.legacyFrontmatter)
+    # posts are converted as they're fetched, convertJobs at a time
+    engine.map(printPost, posts, args.convertJobs)
+
+
+def _printFromMirror(args):
+    if args.query:
+        logger.error("search (-q) is not supported with --mirror")
+        return -1
+    from .mirror import Mirror, mirrorPath
+    mirror = Mirror(mirrorPath(args.blogid or args.url))
+    try:
+        if args.doc and not mirror.hasContent():
+            logger.error("The mirror has no post bodies - run sync --bodies")
+            return -1
+        _printAll(args, mirror.posts(postIds=args.postId, labels=args.labels,
+                                     url=args.u, maxResults=args.count))
+    finally:
+        mirror.close()
+    return 0
+
+
+# what printPosts needs to write a post as a document
+DOC_FIELDS = ["id", "title", "url", "labels", "published", "updated",
+              "status", "content"]
+
+
+def _postFields(args):
+    """The post fields get prints - the only ones worth downloading"""
+    if args.doc:
+        return DOC_FIELDS
+    return args.fields.split(",")
+
+
+def _postsById(blogger, postIds, batchSize, fields=None, failed=None):
+    """The posts with postIds - the ids of those that could not be fetched
+    are added to failed (a list)"""
+    for postId, post, error in blogger.getPostsById(postIds, batchSize,
+                                                    fields=fields):
+        if error:
+            logger.error("Could not get %s: %s", postId, error)
+            if failed is not None:
+                failed.append(postId)
+        elif post is None:
+            logger.warning("Post %s not found", postId)
+        else:
+            yield post
+
+
+def _previous(manifest, args):
+    """What the manifest has for the post a file updates, if anything"""
+    if args.command == "update" and not args.force:
+        return manifest.get(args.postId)
+    return None
 
 
-def processItem(args, contentArgs=None):
-    blogger = EasyBlogger(args.clientid, args.secret, args.blogid,
-                          args.url)
+def _needsRender(manifest, args):
+    previous = _previous(manifest, args)
+    return not previous or previous.get("source") != args.hashes["source"]
+
+
+def _prerender(blogger, argsList, manifest):
+    """Converts the asciidoc files about to be published with one asciidoctor
+    process instead of one each"""
+    contents = [a.content for a in argsList
+                if a.format == "asciidoc" and _needsRender(manifest, a)]
+    if len(contents) < 2:
+        return
+    try:
+        blogger.prerender(contents, "asciidoc")
+    except Exception as e:
+        # they'll be converted one at a time
+        logger.warning("Could not convert asciidoc files together: %s", e)
+
+
+def _renderChanged(blogger, args, manifest):
+    """Renders a file's post unless the manifest shows that isn't needed.
+    Returns (skip, content, format) - skip is True if the published post is
+    already up to date"""
+    hashes = args.hashes
+    previous = _previous(manifest, args)
+    if previous and previous.get("source") == hashes["source"]:
+        # only the frontmatter changed - leave the content as it is
+        hashes["html"] = previous.get("html")
+        return False, None, "html"
+    html = blogger.getMarkup(args.content, args.format, args.filters)
+    hashes["html"] = contentHash(html)
+    if previous and previous.get("html") == hashes["html"] and \
+            previous.get("frontmatter") == hashes["frontmatter"]:
+        manifest.record(args.postId, hashes)
+        return True, None, None
+    return False, html, "html"
+
+
+def processItem(args, contentArgs=None, blogger=None, manifest=None):
+    from oauth2client.client import AccessTokenRefreshError
+    blogger = blogger or newBlogger(args)
     # print("In processItem")
     try:
+        if args.command in ("post", "update"):
+            if manifest is None:
+                content, fmt = args.content or args.file, args.format
+            else:
+                skip, content, fmt = _renderChanged(blogger, args, manifest)
+                if skip:
+                    logger.info("%s: no change in rendered post - skipping",
+                                args.postId)
+                    inc("posts_total", result="skipped")
+                    return 0
+
         if args.command == "post":
             newPost = blogger.post(args.title,
-                                   args.content or args.file,
+                                   content,
                                    args.labels,
                                    args.filters,
                                    isDraft=not args.publish,
-                                   fmt=args.format,
+                                   fmt=fmt,
                                    publishDate=args.publishDate)
             postId = newPost['id']
             logger.debug("Created post: %s", postId)
             if contentArgs:
                 contentArgs.updateFileWithPostId(postId)
+            if manifest is not None:
+                manifest.record(postId, args.hashes)
+            inc("posts_total", result="published")
             print(newPost['url'])
 
         if args.command == 'delete':
             logger.debug("Deleting post: %s", args.postIds)
-            for postId in args.postIds:
-                blogger.deletePost(postId)
+            failed = False
+            for postId, error in blogger.deletePosts(args.postIds,
+                                                     args.batchSize):
+                if error:
+                    failed = True
+                    logger.error("Could not delete %s: %s", postId, error)
+                else:
+                    logger.info("Deleted %s", postId)
+            if failed:
+                return -1
 
         if args.command == 'update':
             logger.debug("Updating post: %s", args.postId)
             updated = blogger.updatePost(
                 args.postId,
                 args.title,
-                args.content or args.file,
+                content,
                 args.labels,
                 args.filters,
                 isDraft=not args.publish,
-                fmt=args.format,
-                publishDate=args.publishDate)
+                fmt=fmt,
+                publishDate=args.publishDate,
+                postStatus=getattr(args, "postStatus", None))
+            if manifest is not None:
+                manifest.record(args.postId, args.hashes)
+            inc("posts_total", result="published")
             print(updated['url'])
 
+        if args.command == "sync":
+            # sqlite is only loaded by the commands that use the mirror
+            from .mirror import Mirror, mirrorPath
+            mirror = Mirror(mirrorPath(args.blogid or args.url))
+            try:
+                fetched, pruned = mirror.sync(blogger, args.bodies,
+                                              args.full)
+            finally:
+                mirror.close()
+            logger.info("Mirror has %d updated and %d deleted posts",
+                        fetched, pruned)
+
+        if args.command == "get" and args.mirror:
+            return _printFromMirror(args)
+
         if args.command == "get":
             fetchBodies = not args.nocontent
-            if args.postId:
-                posts = blogger.getPosts(postId=args.postId)
+            fields = _postFields(args)
+            failed = []
+            if args.postId and len(args.postId) == 1:
+                posts = blogger.getPosts(postId=args.postId[0],
+                                         fields=fields)
+            elif args.postId:
+                posts = _postsById(blogger, args.postId, args.batchSize,
+                                   fields, failed)
             elif args.query:
                 posts = blogger.getPosts(
                     query=args.query,
                     fetchBodies=fetchBodies,
-                    maxResults=args.count)
+                    maxResults=args.count,
+                    fields=fields)
             elif args.u:
                 posts = blogger.getPosts(
-                    url=args.u)
+                    url=args.u,
+                    fields=fields)
             else:
                 posts = blogger.getPosts(
                     labels=args.labels,
                     fetchBodies=fetchBodies,
-                    maxResults=args.count)
-            jobs = [gevent.spawn(printPosts,
-                                 item, args.fields, args.doc, args.tofiles,
-                                 args.legacyFrontmatter)
-                    for item in posts]
-            gevent.wait(jobs)
+                    maxResults=args.count,
+                    fields=fields)
+            _printAll(args, posts)
+            if failed:
+                return -1
 
         if args.command == "listblogs":
             blogger.getListOfBlogs(args.fields)
@@ -374,23 +735,168 @@ def processItem(args, contentArgs=None):
     return 0
 
 
+def _prefetchPostStatuses(blogger, argsList, batchSize):
+    """Looks up the status of all posts to be updated with batched requests
+    so that each update is a single request"""
+    updates = [a for a in argsList if a.command == "update"]
+    if len(updates) < 2:
+        return
+    try:
+        statuses = blogger.getPostStatuses([a.postId for a in updates],
+                                           batchSize)
+    except Exception as e:
+        logger.warning("Could not prefetch post statuses: %s", e)
+        return
+    for a in updates:
+        a.postStatus = statuses.get(a.postId)
+
+
+def _unchanged(manifest, args, contentArgs):
+    """Hashes a file's post and checks whether it changed since it was last
+    published"""
+    args.hashes = fileHashes(args.content, args.format, args.filters,
+                             contentArgs.frontMatter)
+    if args.force or args.command != "update":
+        return False
+    previous = manifest.get(args.postId)
+    return previous is not None and \
+        previous.get("source") == args.hashes["source"] and \
+        previous.get("frontmatter") == args.hashes["frontmatter"]
+
+
+# files read and converted (asciidoc ones together) at a time - a file run
+# holds at most this many files' content, plus those being published
+FILE_CHUNK = 100
+
+# the run's settings a FileJob reads from the run's args
+RUN_ARGS = ("clientid", "secret", "verbose", "engine", "jobs", "convertJobs",
+            "rate", "dailyQuota", "retries", "trace", "timings",
+            "metricsFile", "apiEndpoint", "batchSize", "prefetch",
+            "pandocServers", "conversionCache", "blogid", "url", "force")
+
+
+class FileJob(object):
+    """A file of a file run - the post's settings from its frontmatter (as
+    ContentArgParser.updateArgs sets them), its content while it's being
+    published, and its hashes. The run's settings (RUN_ARGS) are read from
+    the run's args rather than each file getting a copy of them."""
+    __slots__ = ("run", "filename", "contentArgs", "content", "title",
+                 "labels", "format", "filters", "postId", "command",
+                 "publish", "publishDate", "hashes", "postStatus")
+
+    def __init__(self, run, filename):
+        self.run = run
+        self.filename = filename
+        # updateArgs only sets the id of posts that were published before
+        self.postId = self.postStatus = None
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't set
+        if name not in RUN_ARGS:
+            raise AttributeError(name)
+        return getattr(self.run, name)
+
+    def read(self):
+        """Reads the file - it's closed again before this returns"""
+        with open(self.filename, "r", newline="\n", encoding='utf-8') as fh:
+            with span("frontmatter", file=self.filename):
+                self.contentArgs = ContentArgParser(fh)
+                self.contentArgs.updateArgs(self)
+        return self
+
+    def release(self):
+        """Drops the file's content once its post is published"""
+        self.content = self.contentArgs = None
+
+
+def _changedFiles(args, filenames, blogger, manifest, failed):
+    """Reads filenames - those that changed since they were last published
+    are returned ready to publish, those that can't be read are added to
+    failed"""
+    changed = []
+    for f in filenames:
+        try:
+            job = FileJob(args, f).read()
+            unchanged = _unchanged(manifest, job, job.contentArgs)
+        except Exception as e:
+            logger.error("Could not read %s: %s", f, e)
+            failed.append(f)
+            inc("posts_total", result="failed")
+            continue
+        if unchanged:
+            logger.info("%s is unchanged - skipping", f)
+            inc("posts_total", result="skipped")
+            job.release()
+        else:
+            changed.append(job)
+    _prefetchPostStatuses(blogger, changed, args.batchSize)
+    _prerender(blogger, changed, manifest)
+    return changed
+
+
+def _fileJobs(args, filenames, blogger, manifest, failed):
+    """The changed files' jobs, read a chunk at a time. The engine only asks
+    for the next job once a worker can take it, so the next chunk is read
+    and converted while the last of the previous chunk's posts are still
+    being published."""
+    for start in range(0, len(filenames), FILE_CHUNK):
+        if start:
+            # what's been published so far is kept even if the run is
+            # killed before it's done
+            manifest.save()
+        for job in _changedFiles(args, filenames[start:start + FILE_CHUNK],
+                                 blogger, manifest, failed):
+            yield job
+
+
+def _publishFiles(args, filenames, blogger, engine, manifest):
+    """Publishes those of filenames that changed since they were last
+    published - returns the files whose posts could not be published"""
+    failed = []
+
+    def process(job):
+        with span("publish", file=job.filename):
+            try:
+                result = processItem(job, job.contentArgs, blogger, manifest)
+            except Exception:
+                failed.append(job.filename)
+                inc("posts_total", result="failed")
+                raise
+            finally:
+                job.release()
+            if result:
+                failed.append(job.filename)
+                inc("posts_total", result="failed")
+    try:
+        # enough workers to keep both the api and the converters busy - the
+        # limits on the blogger keep each within bounds
+        engine.map(process,
+                   _fileJobs(args, filenames, blogger, manifest, failed),
+                   args.jobs + args.convertJobs)
+    finally:
+        # the posts that were published are recorded even if the run fails
+        manifest.save()
+    return failed
+
+
 def runner(args):
     if args.command == "file":
-        jobs = []
+        engine = getEngine(args.engine)
+        # one blogger for the whole run so that credentials, the service and
+        # the blog id lookup are shared by all files
+        blogger = newBlogger(args)
+        # what was last published, to skip files that haven't changed
+        manifest = Manifest()
+        blogger.apiLimit = engine.semaphore(args.jobs)
+        blogger.convertLimit = engine.semaphore(args.convertJobs)
         files = frozenset()
         for fn in args.file:
             files = files.union(glob.iglob(fn))
         logger.info("Processing files: %s", files)
-        for f in files:
-            argsCopy = copy.deepcopy(args)
-            with open(f, "r", newline="\n", encoding='utf-8') as fh:
-                logger.info("filehandle: %s", fh)
-                argsCopy.file = fh
-                contentArgs = ContentArgParser(fh)
-                contentArgs.updateArgs(argsCopy)
-                logger.debug("Updated args: %s", argsCopy)
-                jobs.append(gevent.spawn(processItem, argsCopy, contentArgs))
-        gevent.wait(jobs)
+        failed = _publishFiles(args, list(files), blogger, engine, manifest)
+        if failed:
+            logger.error("Could not publish %s", ", ".join(sorted(failed)))
+            return -1
         return 0
     else:
         return processItem(args)
@@ -398,4 +904,4 @@ def runner(args):
 
 if __name__ == '__main__':
     # print sys.argv
-    main()
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import logging
+import os.path
+
+from .util import atomicWrite, cacheDir
+logger = logging.getLogger(__name__)
+
+# keys that are written back by easyblogger - they don't change the post
+_IGNORED_KEYS = ("id", "PostId")
+
+
+def _sha(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True,
+                                   default=str).encode("utf-8")).hexdigest()
+
+
+def contentHash(html):
+    return _sha(html)
+
+
+def fileHashes(content, fmt, filters, frontMatter):
+    """Hashes of a source file - ``source`` covers everything that goes into
+    rendering the post and ``frontmatter`` the rest of its metadata"""
+    frontMatter = dict((k, v) for k, v in (frontMatter or {}).items()
+                       if k not in _IGNORED_KEYS)
+    return {"source": _sha([content, fmt, filters]),
+            "frontmatter": _sha(frontMatter)}
+
+
+class Manifest(object):
+    """What was last published for each post - post id to the hashes of its
+    source, frontmatter and rendered html. Lets ``file`` skip converting
+    and uploading posts that haven't changed."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cacheDir(), "manifest.json")
+        self.entries = None
+        self.dirty = False
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def get(self, postId):
+        if not postId:
+            return None
+        return self._load().get(postId)
+
+    def record(self, postId, hashes):
+        self._load()[postId] = hashes
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            atomicWrite(self.path, json.dumps(self.entries).encode("utf-8"))
+            self.dirty = False
+        except (IOError, OSError) as e:
+            logger.warning("Could not save manifest %s: %s", self.path, e)
@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from .trace import NO_SPAN
+from .util import atomicWrite
+
+PREFIX = "easyblogger_"
+
+# upper bounds (seconds) of the latency histograms' buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# name: (type, help)
+METRICS = {
+    "api_requests_total": (
+        "counter", "Api calls by method and http status, batched ones "
+        "included"),
+    "api_request_duration_seconds": (
+        "histogram", "Time taken by api round trips by method (batch for "
+        "batched calls)"),
+    "http_responses_total": ("counter", "Http responses by status"),
+    "http_sent_bytes_total": ("counter", "Bytes of http request bodies"),
+    "http_received_bytes_total": ("counter", "Bytes of http response bodies"),
+    "conversion_duration_seconds": (
+        "histogram", "Time taken by document conversions by backend"),
+    "conversion_cache_total": (
+        "counter", "Conversion cache lookups by result (hit or miss)"),
+    "posts_total": (
+        "counter", "Posts by result (published, skipped or failed)"),
+    "ratelimit_throttled_total": (
+        "counter", "Api calls that waited for the rate limit"),
+    "ratelimit_retries_total": ("counter", "Api calls that were retried"),
+    "quota_used": ("gauge", "Api calls made today against --daily-quota"),
+    "run_duration_seconds": ("gauge", "How long the run took"),
+    "run_success": ("gauge", "1 if the run succeeded, else 0"),
+    "last_run_timestamp_seconds": ("gauge", "When the run ended"),
+}
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+def _format(name, labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return PREFIX + name
+    return "%s%s{%s}" % (PREFIX, name, ",".join(
+        '%s="%s"' % (k, _escape(v)) for k, v in labels))
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return "%d" % value
+    return repr(float(value))
+
+
+class Metrics(object):
+    """Counters, gauges and latency histograms of a run - written out at the
+    end as a node-exporter textfile (prometheus text format) or json."""
+
+    def __init__(self):
+        self.started = time.time()
+        # name: {labels: value} - histograms' values are
+        # [bucket counts..., count, sum]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        labels = _labels(labels)
+        with self._lock:
+            series = self.values.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.values.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        labels = _labels(labels)
+        with self._lock:
+            series = self.values.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - started, **labels)
+
+    def finish(self, success):
+        now = time.time()
+        self.set("run_duration_seconds", now - self.started)
+        self.set("run_success", 1 if success else 0)
+        self.set("last_run_timestamp_seconds", now)
+
+    def textfile(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self.values):
+                kind, help = METRICS[name]
+                lines.append("# HELP %s%s %s" % (PREFIX, name, help))
+                lines.append("# TYPE %s%s %s" % (PREFIX, name, kind))
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != "histogram":
+                        lines.append("%s %s" % (_format(name, labels),
+                                                _number(value)))
+                        continue
+                    for bound, count in zip(BUCKETS, value):
+                        lines.append("%s %d" % (
+                            _format(name + "_bucket", labels,
+                                    [("le", _number(bound))]), count))
+                    lines.append("%s %d" % (
+                        _format(name + "_bucket", labels, [("le", "+Inf")]),
+                        value[-2]))
+                    lines.append("%s %s" % (_format(name + "_sum", labels),
+                                            _number(value[-1])))
+                    lines.append("%s %d" % (_format(name + "_count", labels),
+                                            value[-2]))
+        return "\n".join(lines) + "\n"
+
+    def asDict(self):
+        """{name: [{"labels": {...}, "value": n}]} - histograms have count,
+        sum and buckets ({upper bound: count}) instead of a value"""
+        result = {}
+        with self._lock:
+            for name, series in self.values.items():
+                entries = result[PREFIX + name] = []
+                for labels, value in sorted(series.items()):
+                    entry = {"labels": dict(labels)}
+                    if METRICS[name][0] == "histogram":
+                        entry.update(
+                            count=value[-2], sum=value[-1],
+                            buckets=dict((_number(b), c)
+                                         for b, c in zip(BUCKETS, value)))
+                    else:
+                        entry["value"] = value
+                    entries.append(entry)
+        return result
+
+    def write(self, filename):
+        """Writes a .json file as json, anything else as a textfile - always
+        with a rename so that node-exporter never reads half a file"""
+        if filename.endswith(".json"):
+            data = json.dumps(self.asDict(), indent=2, sort_keys=True)
+        else:
+            data = self.textfile()
+        atomicWrite(filename, data.encode("utf-8"))
+
+
+_metrics = None
+
+
+def useMetrics():
+    """Starts collecting metrics - returns the Metrics"""
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def stopMetrics():
+    global _metrics
+    _metrics = None
+
+
+def inc(name, value=1, **labels):
+    """Adds to a counter - does nothing when metrics are off"""
+    if _metrics is not None:
+        _metrics.inc(name, value, **labels)
+
+
+def timer(name, **labels):
+    """Observes how long the block took in a histogram:
+
+        with timer("conversion_duration_seconds", backend="pandoc"):
+            ...
+    """
+    if _metrics is None:
+        return NO_SPAN
+    return _metrics.timer(name, **labels)
+
+
+def meterHttp(http):
+    """Counts the statuses and bytes of an httplib2.Http's requests"""
+    metrics = _metrics
+    if metrics is None:
+        return http
+    request = http.request
+
+    def metered(uri, method="GET", body=None, headers=None, *args, **kwargs):
+        resp, content = request(uri, method, body, headers, *args, **kwargs)
+        metrics.inc("http_responses_total", status=resp.status)
+        if body:
+            metrics.inc("http_sent_bytes_total",
+                        len(body.encode("utf-8")
+                            if not isinstance(body, bytes) else body))
+        metrics.inc("http_received_bytes_total", len(content or b""))
+        return resp, content
+    http.request = metered
+    return http
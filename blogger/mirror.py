@@ -0,0 +1,171 @@
+import calendar
+import hashlib
+import json
+import logging
+import os.path
+import sqlite3
+from datetime import datetime
+
+from .util import cacheDir
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    status TEXT,
+    published TEXT,
+    updated TEXT,
+    updatedTs REAL,
+    item TEXT
+);
+CREATE TABLE IF NOT EXISTS labels (
+    postId TEXT,
+    label TEXT,
+    PRIMARY KEY (postId, label)
+);
+CREATE INDEX IF NOT EXISTS labelsByLabel ON labels (label);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+ALL_STATUSES = ["draft", "live", "scheduled"]
+
+
+def timestamp(value):
+    """Seconds since the epoch (UTC) for an RFC 3339 timestamp as returned by
+    the api - ex: 2018-04-30T14:59:13.512-07:00"""
+    local = datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    seconds = calendar.timegm(local.timetuple())
+    zone = value[19:].lstrip("0123456789.")
+    if zone and zone not in ("Z", "z"):
+        sign = -1 if zone[0] == "-" else 1
+        hours, minutes = zone[1:].split(":")
+        seconds -= sign * (int(hours) * 3600 + int(minutes) * 60)
+    return seconds
+
+
+def mirrorPath(blog):
+    """Mirror database for a blog - by id or url, whichever was given"""
+    key = hashlib.sha1(str(blog).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cacheDir(), "mirror-%s.sqlite" % key)
+
+
+class Mirror(object):
+    """Local SQLite copy of a blog's posts - metadata, labels, status and
+    optionally their bodies. Kept up to date by ``sync``, and lets ``get``
+    answer queries without calling the api."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def getMeta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?",
+                              (key,)).fetchone()
+        return row[0] if row else default
+
+    def setMeta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) "
+                        "VALUES (?, ?)", (key, value))
+
+    def hasContent(self):
+        return self.getMeta("bodies") == "1"
+
+    def upsert(self, item):
+        self.db.execute(
+            "INSERT OR REPLACE INTO posts (id, title, url, status, "
+            "published, updated, updatedTs, item) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (item["id"], item.get("title"), item.get("url"),
+             item.get("status"), item.get("published"), item.get("updated"),
+             timestamp(item["updated"]) if item.get("updated") else None,
+             json.dumps(item)))
+        self.db.execute("DELETE FROM labels WHERE postId = ?", (item["id"],))
+        self.db.executemany("INSERT OR IGNORE INTO labels (postId, label) "
+                            "VALUES (?, ?)",
+                            [(item["id"], l) for l in item.get("labels", [])])
+
+    def prune(self, keepIds):
+        """Drops the posts not in keepIds - ie deleted on the blog"""
+        keep = set(keepIds)
+        stale = [row[0] for row in self.db.execute("SELECT id FROM posts")
+                 if row[0] not in keep]
+        for postId in stale:
+            self.db.execute("DELETE FROM posts WHERE id = ?", (postId,))
+            self.db.execute("DELETE FROM labels WHERE postId = ?", (postId,))
+        return len(stale)
+
+    def posts(self, postIds=None, labels=None, url=None, maxResults=None):
+        """Yields stored posts, newest first. labels is a comma separated
+        string or a list - posts must have all of them"""
+        sql = "SELECT item FROM posts"
+        where = []
+        params = []
+        if postIds:
+            where.append("id IN (%s)" % ",".join("?" * len(postIds)))
+            params.extend(postIds)
+        if labels:
+            if not isinstance(labels, list):
+                labels = [l.strip() for l in labels.split(",") if l.strip()]
+            where.append("id IN (SELECT postId FROM labels WHERE label IN "
+                         "(%s) GROUP BY postId HAVING COUNT(*) = ?)" %
+                         ",".join("?" * len(labels)))
+            params.extend(labels)
+            params.append(len(labels))
+        if url:
+            # match on the path so that http/https and domain don't matter
+            path = "/" + url.split("://", 1)[-1].split("/", 1)[-1]
+            where.append("substr(url, -?) = ?")
+            params.extend([len(path), path])
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY published DESC"
+        if maxResults:
+            sql += " LIMIT %d" % int(maxResults)
+        for row in self.db.execute(sql, params):
+            yield json.loads(row[0])
+
+    def sync(self, blogger, fetchBodies=False, full=False):
+        """Brings the mirror up to date with the blog. Only posts updated
+        since the last sync are fetched unless full is True (or bodies are
+        wanted and weren't stored) - a full sync also drops deleted posts.
+        Returns (fetched, pruned)"""
+        since = self.getMeta("updatedTs")
+        if since is None or (fetchBodies and not self.hasContent()):
+            full = True
+        if not full and self.hasContent():
+            # keep the stored bodies complete
+            fetchBodies = True
+        since = None if full else float(since)
+        newest = since
+        fetched = 0
+        seen = []
+        posts = blogger.getPosts(fetchBodies=fetchBodies, orderBy="updated",
+                                 status=ALL_STATUSES)
+        for item in posts:
+            updatedTs = timestamp(item["updated"])
+            # posts come newest update first - stop at the first one that's
+            # older than the last sync
+            if since is not None and updatedTs < since:
+                break
+            self.upsert(item)
+            seen.append(item["id"])
+            fetched += 1
+            if newest is None or updatedTs > newest:
+                newest = updatedTs
+        pruned = self.prune(seen) if full else 0
+        if newest is not None:
+            self.setMeta("updatedTs", repr(newest))
+        if full:
+            self.setMeta("bodies", "1" if fetchBodies else "0")
+        self.db.commit()
+        logger.info("Synced %d posts, dropped %d", fetched, pruned)
+        return fetched, pruned
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+import sys
+
+FORMATS = ("ndjson", "csv", "tsv")
+
+
+def _cell(value):
+    # lists (labels) and objects (author etc) keep their structure as json
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return u"%s" % value
+
+
+class RowWriter(object):
+    """Writes posts as rows of the given fields - ndjson, csv or tsv (both
+    with a header row, and quoted as csv does when a value has the
+    delimiter, quotes or newlines).
+
+    Rows are rendered into a buffer that's written out every bufferRows rows
+    and on close, rather than one write per post.
+    """
+
+    def __init__(self, fmt, fields, stream=None, bufferRows=1000):
+        self.fmt = fmt
+        self.fields = fields
+        self.stream = stream or sys.stdout
+        self.bufferRows = bufferRows
+        self.buffer = io.StringIO()
+        self.rows = 0
+        self.csv = None
+        if fmt in ("csv", "tsv"):
+            self.csv = csv.writer(self.buffer,
+                                  delimiter="," if fmt == "csv" else "\t",
+                                  lineterminator="\n")
+            self.csv.writerow(fields)
+
+    def write(self, item):
+        if self.csv:
+            self.csv.writerow([_cell(item[k]) if k in item else u""
+                               for k in self.fields])
+        else:
+            self.buffer.write(json.dumps(
+                dict((k, item[k]) for k in self.fields if k in item),
+                ensure_ascii=False, sort_keys=True))
+            self.buffer.write(u"\n")
+        self.rows += 1
+        if self.rows % self.bufferRows == 0:
+            self.flush()
+
+    def flush(self):
+        self.stream.write(self.buffer.getvalue())
+        self.stream.flush()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,223 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import threading
+import time
+try:
+    from shutil import which
+except ImportError:
+    # py2
+    from distutils.spawn import find_executable as which
+
+logger = logging.getLogger(__name__)
+
+# how long a new server gets to start listening
+STARTUP_TIMEOUT = 10
+
+
+def _httpError():
+    try:
+        from http.client import HTTPException
+    except ImportError:
+        # py2
+        from httplib import HTTPException
+    return HTTPException
+
+
+def _freePort():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+class PandocServerPool(object):
+    """Converts with a few long running ``pandoc server`` processes instead
+    of starting pandoc for every document. Has the part of pypandoc's api
+    that easyblogger uses (convert_text, convert_file) and hands conversions
+    the server can't do - filters, extra args, or no server mode in the
+    installed pandoc - to pypandoc.
+
+    The servers are started on first use and stopped at exit.
+    """
+
+    # what metrics call this converter
+    backend = "pandoc-server"
+
+    def __init__(self, size=2, pandoc=None, fallback=None):
+        self.size = size
+        self.pandoc = pandoc
+        self.fallback = fallback
+        self.ports = None
+        self.processes = []
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+        # port: idle connections to that server - a connection is only used
+        # by one conversion at a time
+        self.idle = {}
+        # only held to pop or push an idle connection
+        self._idleLock = threading.Lock()
+
+    def _fallback(self):
+        if self.fallback is None:
+            import pypandoc
+            self.fallback = pypandoc
+        return self.fallback
+
+    def _startServer(self, pandoc):
+        port = _freePort()
+        devnull = open(os.devnull, "wb")
+        try:
+            proc = subprocess.Popen([pandoc, "server", "--port", str(port)],
+                                    stdin=devnull, stdout=devnull,
+                                    stderr=devnull)
+        finally:
+            devnull.close()
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline and proc.poll() is None:
+            try:
+                socket.create_connection(("127.0.0.1", port), 1).close()
+                self.processes.append(proc)
+                return port
+            except (IOError, OSError):
+                time.sleep(0.05)
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        return None
+
+    def start(self):
+        """Starts the servers - returns False if pandoc can't run as one"""
+        with self._lock:
+            if self.ports is not None:
+                return bool(self.ports)
+            self.ports = []
+            pandoc = self.pandoc or os.environ.get("PYPANDOC_PANDOC") or \
+                which("pandoc")
+            if pandoc:
+                for i in range(self.size):
+                    port = self._startServer(pandoc)
+                    if port is None:
+                        break
+                    self.ports.append(port)
+            if self.ports:
+                logger.debug("Started %d pandoc servers: %s",
+                             len(self.ports), self.ports)
+                atexit.register(self.stop)
+            else:
+                logger.warning("pandoc server mode isn't available - "
+                               "running pandoc for each conversion")
+            return bool(self.ports)
+
+    def stop(self):
+        with self._lock:
+            with self._idleLock:
+                for conns in self.idle.values():
+                    for conn in conns:
+                        conn.close()
+                self.idle = {}
+            for proc in self.processes:
+                if proc.poll() is None:
+                    proc.terminate()
+                    proc.wait()
+            self.processes = []
+            self.ports = None
+
+    def _checkout(self, port):
+        with self._idleLock:
+            idle = self.idle.get(port)
+            if idle:
+                return idle.pop()
+        try:
+            from http.client import HTTPConnection
+        except ImportError:
+            # py2
+            from httplib import HTTPConnection
+        return HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def _checkin(self, port, conn):
+        with self._idleLock:
+            self.idle.setdefault(port, []).append(conn)
+
+    def _request(self, source, to, format):
+        port = self.ports[next(self._next) % len(self.ports)]
+        conn = self._checkout(port)
+        body = json.dumps({"text": source, "from": format, "to": to})
+        try:
+            conn.request("POST", "/", body.encode("utf-8"),
+                         {"Content-Type": "application/json",
+                          "Accept": "application/json"})
+            resp = conn.getresponse()
+            data = resp.read().decode("utf-8")
+        except (_httpError(), IOError, OSError):
+            # not put back - the next request connects anew
+            conn.close()
+            raise
+        self._checkin(port, conn)
+        if resp.status != 200:
+            raise RuntimeError("pandoc server failed to convert: %s" % data)
+        if not resp.getheader("Content-Type", "").startswith(
+                "application/json"):
+            return data
+        result = json.loads(data)
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+        return result["output"]
+
+    def convert_text(self, source, to, format, extra_args=(), filters=None,
+                     **kwargs):
+        if filters or extra_args or kwargs or not self.start():
+            return self._fallback().convert_text(
+                source, to, format, extra_args=extra_args, filters=filters,
+                **kwargs)
+        if isinstance(source, bytes):
+            source = source.decode("utf-8")
+        try:
+            return self._request(source, to, format)
+        except (_httpError(), IOError, OSError) as e:
+            logger.warning("pandoc server unreachable (%s) - running pandoc",
+                           e)
+            return self._fallback().convert_text(source, to, format,
+                                                 filters=filters)
+
+    def convert_file(self, source_file, to, format=None, extra_args=(),
+                     filters=None, **kwargs):
+        if format is None or filters or extra_args or kwargs:
+            return self._fallback().convert_file(
+                source_file, to, format=format, extra_args=extra_args,
+                filters=filters, **kwargs)
+        with open(source_file, "rb") as f:
+            source = f.read()
+        return self.convert_text(source, to, format)
+
+
+_pool = None
+_poolSize = 0
+
+
+def usePandocServers(size):
+    """Makes getConverter return a pool of size pandoc servers"""
+    global _pool, _poolSize
+    if _pool is not None:
+        _pool.stop()
+    _pool, _poolSize = None, size
+
+
+def getConverter():
+    """The pandoc converter to use - the server pool if one was asked for,
+    else pypandoc"""
+    global _pool
+    if _poolSize:
+        if _pool is None:
+            # made on first use rather than by usePandocServers, so that its
+            # locks are gevent's once the engine has patched threading
+            _pool = PandocServerPool(_poolSize)
+        return _pool
+    import pypandoc
+    return pypandoc
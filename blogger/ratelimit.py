@@ -0,0 +1,217 @@
+import calendar
+import datetime
+import json
+import logging
+import os.path
+import random
+import socket
+import sys
+import threading
+import time
+
+from .util import atomicWrite, cacheDir
+logger = logging.getLogger(__name__)
+
+# http statuses worth trying again - rate limited or the server's trouble
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# a 403 with one of these reasons is rate limiting rather than a denial
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# Blogger's daily quota resets at midnight pacific time - utc-8, or utc-7
+# while daylight saving time is on
+PST_OFFSET = -8 * 3600
+PDT_OFFSET = -7 * 3600
+
+try:
+    _TRANSIENT = (socket.timeout, ConnectionError)
+except NameError:
+    # py2
+    _TRANSIENT = (socket.timeout,)
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def _reason(error):
+    try:
+        content = error.content
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        return json.loads(content)["error"]["errors"][0]["reason"]
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def isRetryable(error, idempotent=True):
+    """Whether a failed request may succeed if sent again. A request that
+    isn't idempotent (insert, publish) is only retried when it was rate
+    limited - after a server error or a lost connection it may already have
+    been applied, and sending it again would post twice."""
+    resp = getattr(error, "resp", None)
+    if resp is None:
+        return idempotent and isinstance(error, _TRANSIENT)
+    status = getattr(resp, "status", None)
+    if status == 429:
+        return True
+    if status in RETRY_STATUSES:
+        return idempotent
+    return status == 403 and _reason(error) in RATE_LIMIT_REASONS
+
+
+def _nthSunday(year, month, n):
+    """Day of the month of month's nth sunday"""
+    first = datetime.date(year, month, 1).weekday()
+    return 1 + (6 - first) % 7 + 7 * (n - 1)
+
+
+def pacificOffset(now):
+    """Pacific time's offset from utc in seconds at now (a timestamp) - by
+    the US rules: daylight saving time from 2am on the second sunday of
+    march to 2am on the first sunday of november"""
+    year = time.gmtime(now).tm_year
+    start = calendar.timegm((year, 3, _nthSunday(year, 3, 2), 10, 0, 0))
+    end = calendar.timegm((year, 11, _nthSunday(year, 11, 1), 9, 0, 0))
+    return PDT_OFFSET if start <= now < end else PST_OFFSET
+
+
+class RateLimiter(object):
+    """Paces and retries api requests.
+
+    Requests take tokens from a bucket refilled at ``rate`` per second (and
+    holding up to ``burst``) - unless rate is 0 - and count against ``dailyQuota`` - kept in the
+    cache dir across runs - if one is given. Requests that fail with a
+    retryable error are sent again up to ``retries`` times after a jittered,
+    exponentially growing delay. ``stats`` counts what happened.
+    """
+
+    def __init__(self, rate=0, burst=None, dailyQuota=None, retries=5,
+                 backoff=1.0, maxBackoff=64.0, quotaFile=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.dailyQuota = dailyQuota
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.quotaFile = quotaFile
+        self.tokens = self.burst
+        self.last = None
+        self.used = None
+        self.stats = {"requests": 0, "throttled": 0, "throttledSeconds": 0.0,
+                      "retries": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _sleep(self, seconds):
+        # looked up on every call so that gevent's patched sleep is used
+        time.sleep(seconds)
+
+    def _quotaDay(self):
+        now = time.time()
+        return time.strftime("%Y-%m-%d",
+                             time.gmtime(now + pacificOffset(now)))
+
+    def _quotaPath(self):
+        return self.quotaFile or os.path.join(cacheDir(), "quota.json")
+
+    def _loadQuota(self):
+        if self.used is not None:
+            return
+        self.used = 0
+        try:
+            with open(self._quotaPath(), "r") as f:
+                entry = json.load(f)
+            if entry.get("day") == self._quotaDay():
+                self.used = entry.get("used", 0)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def acquire(self, cost=1):
+        """Waits till cost requests may be sent"""
+        with self._lock:
+            if self.dailyQuota:
+                self._loadQuota()
+                if self.used + cost > self.dailyQuota:
+                    raise QuotaExceeded("daily quota of %d requests used up" %
+                                        self.dailyQuota)
+            if self.used is not None:
+                self.used += cost
+            self.stats["requests"] += cost
+            if not self.rate:
+                return
+            now = time.time()
+            if self.last is not None:
+                self.tokens = min(self.burst, self.tokens +
+                                  (now - self.last) * self.rate)
+            self.last = now
+            # take the tokens now (going negative) so that concurrent
+            # callers queue up behind each other
+            self.tokens -= cost
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            if wait:
+                self.stats["throttled"] += 1
+                self.stats["throttledSeconds"] += wait
+        if wait:
+            logger.debug("Throttling request for %.2fs", wait)
+            self._sleep(wait)
+
+    def delay(self, attempt):
+        """Full jitter - a random delay up to backoff * 2^attempt"""
+        return random.uniform(0, min(self.maxBackoff,
+                                     self.backoff * (2 ** attempt)))
+
+    def call(self, fn, cost=1, idempotent=True):
+        """Calls fn (that sends cost requests) once the limits allow, and
+        again while it fails with a retryable error (see isRetryable)"""
+        attempt = 0
+        while True:
+            self.acquire(cost)
+            try:
+                return fn()
+            except Exception as e:
+                if not isRetryable(e, idempotent):
+                    raise
+                if attempt >= self.retries:
+                    with self._lock:
+                        self.stats["failed"] += 1
+                    raise
+                delay = self.delay(attempt)
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+                logger.info("Request failed (%s) - retry %d in %.1fs",
+                            e, attempt, delay)
+                self._sleep(delay)
+
+    def summary(self):
+        return ("api requests: %(requests)d, throttled: %(throttled)d "
+                "(%(throttledSeconds).1fs), retried: %(retries)d, "
+                "failed: %(failed)d" % self.stats)
+
+    def finish(self):
+        """Saves the quota used and reports what happened - to stderr if any
+        requests were retried or failed (waiting for the rate limit is only
+        logged, it's what --rate asks for)"""
+        if self.dailyQuota and self.used is not None:
+            try:
+                atomicWrite(self._quotaPath(),
+                            json.dumps({"day": self._quotaDay(),
+                                        "used": self.used}).encode("utf-8"))
+            except (IOError, OSError) as e:
+                logger.warning("Could not save quota usage: %s", e)
+        if self.stats["retries"] or self.stats["failed"]:
+            sys.stderr.write(self.summary() + "\n")
+        else:
+            logger.info(self.summary())
+
+
+_limiter = None
+
+
+def useRateLimiter(*args, **kwargs):
+    """Makes getRateLimiter return a RateLimiter created with these args"""
+    global _limiter
+    _limiter = RateLimiter(*args, **kwargs)
+    return _limiter
+
+
+def getRateLimiter():
+    return _limiter
@@ -0,0 +1,98 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .engine import NO_LIMIT
+
+# a context manager that does nothing - what span returns when not tracing
+NO_SPAN = NO_LIMIT
+
+
+def _percentile(values, pct):
+    """Nearest rank percentile of sorted values"""
+    rank = max(0, int(math.ceil(pct / 100.0 * len(values))) - 1)
+    return values[rank]
+
+
+class Tracer(object):
+    """Records how long each stage of a run took (spans) - written out as
+    chrome trace events (chrome://tracing, perfetto) and summarized per
+    stage. Spans of each worker show up on their own track."""
+
+    def __init__(self):
+        self.events = []
+        self.start = time.time()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **args):
+        started = time.time()
+        try:
+            yield
+        finally:
+            ended = time.time()
+            event = {"name": name, "ph": "X", "pid": self.pid,
+                     "tid": threading.current_thread().ident,
+                     "ts": int((started - self.start) * 1e6),
+                     "dur": int((ended - started) * 1e6)}
+            if args:
+                event["args"] = args
+            with self._lock:
+                self.events.append(event)
+
+    def write(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": self.events,
+                       "displayTimeUnit": "ms"}, f)
+
+    def timings(self):
+        """{stage: (count, p50, p95, max)} in milliseconds"""
+        durations = {}
+        for event in self.events:
+            durations.setdefault(event["name"], []).append(
+                event["dur"] / 1000.0)
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            result[name] = (len(values), _percentile(values, 50),
+                            _percentile(values, 95), values[-1])
+        return result
+
+    def summary(self):
+        lines = ["%-32s %6s %9s %9s %9s" % ("stage", "count", "p50 ms",
+                                            "p95 ms", "max ms")]
+        for name, (count, p50, p95, most) in sorted(self.timings().items()):
+            lines.append("%-32s %6d %9.1f %9.1f %9.1f" %
+                         (name, count, p50, p95, most))
+        return "\n".join(lines)
+
+
+_tracer = None
+
+
+def useTracer():
+    """Starts recording spans - returns the Tracer"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stopTracing():
+    global _tracer
+    _tracer = None
+
+
+def span(name, **args):
+    """Times a stage of the run:
+
+        with span("convert", format=fmt):
+            ...
+
+    Costs a function call when tracing is off."""
+    if _tracer is None:
+        return NO_SPAN
+    return _tracer.span(name, **args)
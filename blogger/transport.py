@@ -0,0 +1,51 @@
+import logging
+import threading
+from contextlib import contextmanager
+logger = logging.getLogger(__name__)
+
+
+class HttpPool(object):
+    """Keep-alive http connections shared by the workers of a run.
+
+    httplib2.Http can't be used by two workers (threads or greenlets) at
+    once, so each request takes a connection of its own from the pool and
+    puts it back when done - later requests, from any worker, reuse it
+    rather than connecting (and doing a TLS handshake) again. At most size
+    idle connections are kept; how many are in use at once is up to the
+    caller (see EasyBlogger.apiLimit).
+    """
+
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self.idle = []
+        self.created = 0
+        # only held to pop or push - never while a request is made
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        with self._lock:
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+        logger.debug("Opening http connection %d", self.created)
+        return self.factory()
+
+    def _checkin(self, http):
+        with self._lock:
+            if len(self.idle) < self.size:
+                self.idle.append(http)
+                return
+        # enough kept already
+        connections = getattr(http, "connections", None)
+        if isinstance(connections, dict):
+            for conn in connections.values():
+                conn.close()
+
+    @contextmanager
+    def connection(self):
+        http = self._checkout()
+        try:
+            yield http
+        finally:
+            self._checkin(http)
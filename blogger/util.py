@@ -0,0 +1,77 @@
+import errno
+import os
+import os.path
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+
+
+def cacheDir():
+    """Directory for easyblogger's on-disk caches; created on first use.
+
+    Honours ``EASYBLOGGER_CACHE_DIR`` and falls back to ``$XDG_CACHE_HOME``
+    (or ``~/.cache``)/easyblogger.
+    """
+    path = os.environ.get("EASYBLOGGER_CACHE_DIR")
+    if not path:
+        base = os.environ.get("XDG_CACHE_HOME") or \
+            os.path.expanduser("~/.cache")
+        path = os.path.join(base, "easyblogger")
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+
+def _umask():
+    # the only way to read it is to change it - done once, on import, rather
+    # than while other threads may be creating files
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# the mode new files get
+NEW_FILE_MODE = 0o666 & ~_umask()
+
+
+def _fileMode(filename):
+    """Mode for a new version of filename - the existing file's mode or the
+    default for new files (temp files are created 0600)"""
+    try:
+        return os.stat(filename).st_mode & 0o777
+    except OSError:
+        return NEW_FILE_MODE
+
+
+@contextmanager
+def atomicWriter(filename):
+    """A binary file to write the new content of ``filename`` to - it
+    replaces the file (with a rename, so readers never see a partially
+    written file) when the block completes, and is discarded if it fails."""
+    dirname = os.path.dirname(os.path.abspath(filename))
+    mode = _fileMode(filename)
+    with NamedTemporaryFile(dir=dirname, prefix=".easyblogger-",
+                            delete=False) as fp:
+        try:
+            os.chmod(fp.name, mode)
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+        except BaseException:
+            fp.close()
+            os.remove(fp.name)
+            raise
+    try:
+        os.replace(fp.name, filename)
+    except AttributeError:
+        # py2 - no os.replace
+        os.rename(fp.name, filename)
+
+
+def atomicWrite(filename, data):
+    """Write ``data`` (bytes) to ``filename`` via a temp file and a rename so
+    readers never see a partially written file."""
+    with atomicWriter(filename) as fp:
+        fp.write(data)
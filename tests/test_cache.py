@@ -0,0 +1,100 @@
+import os
+import os.path
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from mock import Mock, patch
+from blogger import EasyBlogger
+from blogger.cache import ConversionCache, conversionKey
+
+
+class ConversionCacheTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = ConversionCache(os.path.join(self.dir, "conversions"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_key_should_depend_on_all_inputs(self):
+        key = conversionKey("# hi", "markdown", [], ["pandoc", "2.19"])
+
+        assert key == conversionKey(u"# hi", "markdown", [],
+                                    ["pandoc", "2.19"])
+        assert key != conversionKey("# hi!", "markdown", [],
+                                    ["pandoc", "2.19"])
+        assert key != conversionKey("# hi", "rst", [], ["pandoc", "2.19"])
+        assert key != conversionKey("# hi", "markdown", ["f"],
+                                    ["pandoc", "2.19"])
+        assert key != conversionKey("# hi", "markdown", [],
+                                    ["pandoc", "3.1"])
+
+    def test_key_should_change_when_filter_script_changes(self):
+        script = os.path.join(self.dir, "filter.py")
+        with open(script, "w") as f:
+            f.write("v1")
+        before = conversionKey("# hi", "markdown", [script], [])
+        with open(script, "w") as f:
+            f.write("v2")
+
+        assert before != conversionKey("# hi", "markdown", [script], [])
+
+    def test_should_return_stored_html(self):
+        assert self.cache.get("abc") is None
+
+        self.cache.put("abc", u"<p>é</p>")
+
+        assert self.cache.get("abc") == u"<p>é</p>"
+
+    def test_should_evict_least_recently_used(self):
+        cache = ConversionCache(self.cache.path, maxBytes=25)
+        cache.put("a", "x" * 10)
+        cache.put("b", "x" * 10)
+        # make a the most recently used
+        old = time.time() - 100
+        os.utime(os.path.join(cache.path, "b.html"), (old, old))
+        cache.get("a")
+
+        cache.put("c", "x" * 10)
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+
+@patch('blogger.blogger.getFormatCache')
+class CachedMarkupTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.blogger = EasyBlogger("id", "secret", "1234")
+        self.blogger.converter = Mock()
+        self.blogger.converter.convert_text.return_value = "<h1>hi</h1>"
+        self.blogger.conversionCache = ConversionCache(self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_should_convert_once_for_same_input(self, formatCache):
+        formatCache.return_value.version.return_value = "2.19"
+
+        assert self.blogger.getMarkup("# hi", "markdown") == "<h1>hi</h1>"
+        assert self.blogger.getMarkup("# hi", "markdown") == "<h1>hi</h1>"
+
+        assert self.blogger.converter.convert_text.call_count == 1
+
+    def test_should_convert_again_after_pandoc_upgrade(self, formatCache):
+        formatCache.return_value.version.return_value = "2.19"
+        self.blogger.getMarkup("# hi", "markdown")
+        formatCache.return_value.version.return_value = "3.1"
+
+        self.blogger.getMarkup("# hi", "markdown")
+
+        assert self.blogger.converter.convert_text.call_count == 2
+
+    def test_should_not_cache_html(self, formatCache):
+        assert self.blogger.getMarkup("<p/>", "html") == "<p/>"
+
+        assert os.listdir(self.dir) == []
@@ -1,5 +1,9 @@
+import io
+import os.path
+import shutil
+import tempfile
 from unittest import TestCase
-from mock import DEFAULT, MagicMock, Mock
+from mock import Mock
 from blogger import blogger
 
 
@@ -152,37 +156,29 @@ abc"""
         assert not args.publish
 
     def test_should_update_doc_with_postid(self):
-        def validateFileContent(content):
-            # print(content)
-            assert content.index("1000") > 0
-            return DEFAULT
-
-        fileContent = """
+        tmp = tempfile.mkdtemp()
+        try:
+            name = os.path.join(tmp, "post.md")
+            with io.open(name, "w", encoding="utf-8") as f:
+                f.write(u"""
             <!--
             PostId:
             format: markdown_strict
             -->
-        """
-        try:
-            from io import RawIOBase
-            file = RawIOBase
-        except ImportError:
-            # do nothing
-            pass
-        theFile = MagicMock(spec=file)
-        theFile.name = "thefilename"
-        theFile.read.return_value = fileContent
-
-        mock_open = Mock()
-        mock_open.return_value = theFile
-        fileHandle = theFile.__enter__.return_value
-        fileHandle.write.side_effect = validateFileContent
-
-        parser = blogger.ContentArgParser(theFile, open=mock_open)
-        args = Mock()
-        parser.updateArgs(args)
-        parser.updateFileWithPostId("1000")
-
-        mock_open.assert_called_with(theFile.name, "w", encoding='utf-8')
-        fileHandle.flush.assert_called()
-        fileHandle.write.assert_called()
+the post\n""")
+            with io.open(name, encoding="utf-8", newline="\n") as theFile:
+                parser = blogger.ContentArgParser(theFile)
+                args = Mock()
+                parser.updateArgs(args)
+            parser.updateFileWithPostId("1000")
+
+            with io.open(name, encoding="utf-8") as f:
+                content = f.read()
+            assert os.listdir(tmp) == ["post.md"]
+        finally:
+            shutil.rmtree(tmp)
+
+        assert content.startswith(u"<!--\n")
+        assert u"PostId: '1000'" in content
+        assert u"format: markdown_strict" in content
+        assert content.endswith(u"-->\nthe post\n")
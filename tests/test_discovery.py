@@ -0,0 +1,80 @@
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from mock import Mock, patch
+from blogger import discovery
+
+DOC = json.dumps({"name": "blogger", "version": "v3"})
+
+
+class DiscoveryDocumentTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cacheFile = os.path.join(self.dir, "blogger-v3.json")
+        self.http = Mock()
+        resp = Mock()
+        resp.status = 200
+        self.http.request.return_value = (resp, DOC.encode("utf-8"))
+
+    def tearDown(self):
+        discovery._documents.clear()
+        shutil.rmtree(self.dir)
+
+    def writeCache(self, content, age=0):
+        with open(self.cacheFile, "w") as f:
+            f.write(content)
+        then = time.time() - age
+        os.utime(self.cacheFile, (then, then))
+
+    def test_should_use_fresh_local_copy_without_fetching(self):
+        self.writeCache(json.dumps({"name": "cached"}))
+
+        doc = discovery.getDiscoveryDocument(self.http, self.cacheFile)
+
+        assert doc["name"] == "cached"
+        self.http.request.assert_not_called()
+
+    @patch('blogger.discovery._bundledDocument')
+    def test_should_seed_from_bundled_copy(self, bundled):
+        bundled.return_value = json.dumps({"name": "bundled"})
+
+        doc = discovery.getDiscoveryDocument(self.http, self.cacheFile)
+
+        assert doc["name"] == "bundled"
+        self.http.request.assert_not_called()
+        assert os.path.exists(self.cacheFile)
+
+    @patch('blogger.discovery._bundledDocument')
+    def test_should_fetch_when_nothing_local(self, bundled):
+        bundled.return_value = None
+
+        doc = discovery.getDiscoveryDocument(self.http, self.cacheFile)
+
+        assert doc["name"] == "blogger"
+        self.http.request.assert_called_with(discovery.DISCOVERY_URL)
+        with open(self.cacheFile) as f:
+            assert json.load(f)["name"] == "blogger"
+
+    def test_should_refresh_stale_copy(self):
+        self.writeCache(json.dumps({"name": "cached"}),
+                        age=discovery.DISCOVERY_TTL + 10)
+
+        doc = discovery.getDiscoveryDocument(self.http, self.cacheFile)
+
+        assert doc["name"] == "blogger"
+
+    def test_should_keep_stale_copy_when_offline(self):
+        self.writeCache(json.dumps({"name": "cached"}),
+                        age=discovery.DISCOVERY_TTL + 10)
+        self.http.request.side_effect = IOError("offline")
+
+        doc = discovery.getDiscoveryDocument(self.http, self.cacheFile)
+
+        assert doc["name"] == "cached"
+        age = time.time() - os.path.getmtime(self.cacheFile)
+        assert age < discovery.DISCOVERY_TTL
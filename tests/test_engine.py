@@ -0,0 +1,87 @@
+from unittest import TestCase
+from blogger.engine import NO_LIMIT, getEngine
+
+
+class EngineTests(TestCase):
+
+    def test_serial_map_should_run_every_item(self):
+        engine = getEngine("serial")
+        seen = []
+
+        engine.map(seen.append, iter(range(5)), 2)
+
+        assert seen == [0, 1, 2, 3, 4]
+        assert engine.semaphore(2) is NO_LIMIT
+
+    def test_gevent_map_should_bound_workers_and_queued_items(self):
+        engine = getEngine("gevent")
+        import gevent
+        state = {"running": 0, "most": 0, "produced": 0}
+        done = []
+
+        def items():
+            for i in range(20):
+                state["produced"] += 1
+                # never more than the running and queued items ahead
+                assert state["produced"] - len(done) <= 3 + 3 + 1
+                yield i
+
+        def job(i):
+            state["running"] += 1
+            state["most"] = max(state["most"], state["running"])
+            gevent.sleep(0.001)
+            state["running"] -= 1
+            done.append(i)
+
+        engine.map(job, items(), 3)
+
+        assert sorted(done) == list(range(20))
+        assert state["most"] == 3
+
+    def test_gevent_map_should_survive_failing_jobs(self):
+        engine = getEngine("gevent")
+        done = []
+
+        def job(i):
+            if i == 1:
+                raise ValueError(i)
+            done.append(i)
+
+        engine.map(job, [0, 1, 2], 1)
+
+        assert done == [0, 2]
+
+    def test_gevent_map_should_finish_queued_items_if_items_fail(self):
+        engine = getEngine("gevent")
+        import gevent
+        done = []
+
+        def job(i):
+            gevent.sleep(0.001)
+            done.append(i)
+
+        def items():
+            yield 0
+            yield 1
+            raise ValueError("unreadable")
+
+        with self.assertRaises(ValueError):
+            engine.map(job, items(), 2)
+
+        assert sorted(done) == [0, 1]
+
+    def test_gevent_semaphore_should_limit(self):
+        engine = getEngine("gevent")
+        import gevent
+        limit = engine.semaphore(2)
+        state = {"running": 0, "most": 0}
+
+        def job():
+            with limit:
+                state["running"] += 1
+                state["most"] = max(state["most"], state["running"])
+                gevent.sleep(0.001)
+                state["running"] -= 1
+        engine.wait([engine.spawn(job) for i in range(6)])
+
+        assert state["most"] == 2
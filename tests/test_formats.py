@@ -0,0 +1,63 @@
+import json
+import os
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+from mock import Mock, patch
+from blogger.formats import FormatCache
+
+
+class FormatCacheTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cacheFile = os.path.join(self.dir, "formats.json")
+        self.pandoc = os.path.join(self.dir, "pandoc")
+        with open(self.pandoc, "w") as f:
+            f.write("")
+        self.converter = Mock()
+        self.converter.get_pandoc_formats.return_value = (["markdown"],
+                                                          ["asciidoc"])
+        self.converter.get_pandoc_version.return_value = "2.19"
+        self.env = patch.dict(os.environ, {"PYPANDOC_PANDOC": self.pandoc})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.dir)
+
+    def test_should_probe_and_write_cache_when_missing(self):
+        cache = FormatCache(self.cacheFile, converter=self.converter)
+
+        assert cache.inputFormats() == ["markdown"]
+        assert cache.outputFormats() == ["asciidoc"]
+
+        assert self.converter.get_pandoc_formats.call_count == 1
+        with open(self.cacheFile) as f:
+            entry = json.load(f)
+        assert entry["path"] == self.pandoc
+        assert entry["version"] == "2.19"
+
+    def test_should_not_probe_when_cache_is_fresh(self):
+        FormatCache(self.cacheFile, converter=self.converter).inputFormats()
+        converter = Mock()
+
+        cache = FormatCache(self.cacheFile, converter=converter)
+
+        assert cache.inputFormats() == ["markdown"]
+        assert cache.version() == "2.19"
+        converter.get_pandoc_formats.assert_not_called()
+
+    def test_should_probe_when_pandoc_binary_changes(self):
+        FormatCache(self.cacheFile, converter=self.converter).inputFormats()
+        mtime = os.path.getmtime(self.pandoc)
+        os.utime(self.pandoc, (mtime + 10, mtime + 10))
+        converter = Mock()
+        converter.get_pandoc_formats.return_value = (["gfm"], ["html"])
+        converter.get_pandoc_version.return_value = "3.1"
+
+        cache = FormatCache(self.cacheFile, converter=converter)
+
+        assert cache.inputFormats() == ["gfm"]
+        converter.get_pandoc_formats.assert_called()
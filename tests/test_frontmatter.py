@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+import yaml
+from mock import patch
+from blogger.frontmatter import dumpYaml, loadYaml, rewrite, scan
+
+
+class ScanTests(TestCase):
+
+    def test_should_find_toml(self):
+        found = scan(u'\n+++\ntitle = "t"\n+++\nthe post\n')
+
+        assert found.format == "toml"
+        assert found.opener == "+++"
+        assert found.text == u'\ntitle = "t"\n'
+        assert found.body == u"\nthe post\n"
+
+    def test_should_find_yaml_in_comments(self):
+        html = scan(u"  <!--\nTitle: t\n-->\nthe post")
+        asciidoc = scan(u"////\nTitle: t\n////\nthe post")
+
+        assert (html.format, html.opener) == ("yaml", "<!--")
+        assert (asciidoc.format, asciidoc.opener) == ("yaml", "////")
+        assert html.body == asciidoc.body == u"\nthe post"
+
+    def test_should_go_by_the_leading_delimiter(self):
+        found = scan(u"<!--\nTitle: t\n-->\n+++\nnot frontmatter\n+++\n")
+
+        assert found.format == "yaml"
+        assert found.body == u"\n+++\nnot frontmatter\n+++\n"
+
+    def test_should_drop_blank_lines_after_the_block(self):
+        assert scan(u"+++\n+++  \n\n\n  the post").body == u"\n  the post"
+        assert scan(u"+++\n+++\n  \n").body == u""
+
+    def test_should_need_a_leading_closed_block(self):
+        assert scan(u"the post\n+++\n+++\n") is None
+        assert scan(u"+++\ntitle = 't'\n") is None
+        assert scan(u"") is None
+
+
+FRONTMATTER = {
+    "title": u"Caf\xe9 - \"quoted\": a long title " * 4,
+    "id": "8010087245053438499",
+    "tags": [u"\u65e5\u672c\u8a9e", "a: b"],
+    "aliases": ["http://example.blogspot.com/2018/04/post.html"],
+    "publishdate": "2018-04-30T12:42:00+05:30",
+    "draft": False,
+}
+
+
+class YamlCodecTests(TestCase):
+
+    def _withoutLibyaml(self, fn, *args):
+        with patch.object(yaml, "CSafeLoader", yaml.SafeLoader,
+                          create=True), \
+                patch.object(yaml, "CSafeDumper", yaml.SafeDumper,
+                             create=True):
+            return fn(*args)
+
+    def test_should_round_trip(self):
+        assert loadYaml(dumpYaml(FRONTMATTER)) == FRONTMATTER
+
+    def test_should_write_the_same_without_libyaml(self):
+        text = dumpYaml(FRONTMATTER)
+
+        assert self._withoutLibyaml(dumpYaml, FRONTMATTER) == text
+        assert self._withoutLibyaml(loadYaml, text) == loadYaml(text)
+
+    def test_should_write_escapes_as_pyyaml_does(self):
+        # libyaml folds long double quoted strings and escapes characters
+        # beyond the bmp differently
+        data = {"title": u"tab\tseparated " * 10 + u"\U0001F600"}
+
+        assert dumpYaml(data) == \
+            self._withoutLibyaml(dumpYaml, data)
+
+
+class RewriteTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.name = os.path.join(self.dir, "post.adoc")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, data):
+        with open(self.name, "wb") as f:
+            f.write(data)
+
+    def _read(self):
+        with open(self.name, "rb") as f:
+            return f.read()
+
+    def test_should_set_fields_and_copy_the_body(self):
+        # the body isn't decoded, let alone re-encoded
+        body = b"\r\n= Caf\xc3\xa9\r\nnot utf-8: \xff\r\n"
+        self._write(b'+++\r\ntitle = "t"\r\n+++' + body)
+
+        fields = rewrite(self.name, {"id": "1234"})
+
+        assert fields == {"title": "t", "id": "1234"}
+        assert self._read() == \
+            b'+++\r\ntitle = "t"\r\nid = "1234"\r\n\r\n+++' + body
+        assert os.listdir(self.dir) == ["post.adoc"]
+
+    def test_should_keep_the_comment_style(self):
+        self._write(b"////\nTitle: t\n////\nthe post")
+
+        rewrite(self.name, {"PostId": "1234"})
+
+        assert self._read() == \
+            b"////\nPostId: '1234'\nTitle: t\n\n////\nthe post"
+
+    def test_should_leave_files_without_frontmatter_alone(self):
+        self._write(b"just a post\n")
+
+        with self.assertRaises(ValueError):
+            rewrite(self.name, {"id": "1234"})
+
+        assert self._read() == b"just a post\n"
+        assert os.listdir(self.dir) == ["post.adoc"]
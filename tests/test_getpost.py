@@ -1,3 +1,4 @@
+import time
 from unittest import TestCase
 from mock import Mock
 from blogger import EasyBlogger
@@ -117,3 +118,121 @@ class GetPostsTests(TestCase):
         self.posts.get.assert_called_with(
             blogId="1234", postId="234", view="AUTHOR")
         req.execute.assert_called()
+
+
+class PagingTests(TestCase):
+
+    def setUp(self):
+        self.blogger = EasyBlogger("id", "secret", "1234")
+        self.blogger.service = Mock()
+        self.posts = self.blogger.service.posts.return_value
+        self.pages = [{"items": [{"id": "1"}, {"id": "2"}],
+                       "nextPageToken": "t1"},
+                      {"items": [{"id": "3"}, {"id": "4"}],
+                       "nextPageToken": "t2"},
+                      {"items": [{"id": "5"}]}]
+        self.fetched = []
+
+        def listPosts(**kwargs):
+            request = Mock()
+            page = self.pages[["t1", "t2"].index(kwargs["pageToken"]) + 1] \
+                if "pageToken" in kwargs else self.pages[0]
+
+            def execute(http=None):
+                self.fetched.append(page)
+                return page
+            request.execute.side_effect = execute
+            return request
+        self.posts.list.side_effect = listPosts
+
+    def test_should_get_all_pages(self):
+        ids = [p["id"] for p in self.blogger.getPosts()]
+
+        assert ids == ["1", "2", "3", "4", "5"]
+        assert self.posts.list.call_args[1]["pageToken"] == "t2"
+
+    def test_should_ask_for_remaining_posts_only(self):
+        ids = [p["id"] for p in self.blogger.getPosts(maxResults=3)]
+
+        assert ids == ["1", "2", "3"]
+        assert self.posts.list.call_count == 2
+        assert self.posts.list.call_args[1]["maxResults"] == 1
+
+    def test_should_fetch_next_page_while_caller_works(self):
+        posts = self.blogger.getPosts()
+        next(posts)
+        # the caller is on page 1 - page 2 comes in meanwhile
+        for i in range(100):
+            if len(self.fetched) > 1:
+                break
+            time.sleep(0.01)
+
+        assert len(self.fetched) >= 2
+        posts.close()
+
+    def test_should_fetch_pages_on_demand_without_prefetch(self):
+        self.blogger.prefetchPages = 0
+        posts = self.blogger.getPosts()
+        next(posts)
+
+        assert len(self.fetched) == 1
+        assert [p["id"] for p in posts] == ["2", "3", "4", "5"]
+
+    def test_should_raise_errors_from_background_fetch(self):
+        resp = Mock()
+        resp.status = 500
+        listPosts = self.posts.list.side_effect
+
+        def failSecondPage(**kwargs):
+            request = listPosts(**kwargs)
+            if "pageToken" in kwargs:
+                request.execute.side_effect = HttpError(resp, content)
+            return request
+        self.posts.list.side_effect = failSecondPage
+
+        posts = self.blogger.getPosts()
+        assert [next(posts)["id"], next(posts)["id"]] == ["1", "2"]
+        with self.assertRaises(HttpError):
+            next(posts)
+
+
+class ProjectionTests(TestCase):
+
+    def setUp(self):
+        self.blogger = EasyBlogger("id", "secret", "1234")
+        self.blogger.service = Mock()
+        self.posts = self.blogger.service.posts.return_value
+
+    def test_should_ask_for_listed_fields_and_page_token(self):
+        req = self.posts.list.return_value
+        req.execute.return_value = {"items": []}
+
+        list(self.blogger.getPosts(labels="abc", fields="id,title,b"))
+
+        assert self.posts.list.call_args[1]["fields"] == \
+            "nextPageToken,items(id,title)"
+
+    def test_should_ask_for_fields_of_single_post(self):
+        self.posts.get.return_value.execute.return_value = {"id": "1"}
+
+        list(self.blogger.getPosts(postId="1", fields=["id", "url"]))
+
+        self.posts.get.assert_called_with(blogId="1234", postId="1",
+                                          view="AUTHOR", fields="id,url")
+
+    def test_should_get_whole_posts_without_known_fields(self):
+        req = self.posts.list.return_value
+        req.execute.return_value = {"items": []}
+
+        list(self.blogger.getPosts(fields="b"))
+
+        assert "fields" not in self.posts.list.call_args[1]
+
+    def test_should_ask_for_listed_blog_fields(self):
+        blogs = self.blogger.service.blogs.return_value
+        blogs.listByUser.return_value.execute.return_value = {"items": []}
+
+        self.blogger.getListOfBlogs("id,name,url")
+
+        blogs.listByUser.assert_called_with(userId="self",
+                                            fields="items(id,name,url)")
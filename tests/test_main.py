@@ -1,14 +1,23 @@
 from unittest import TestCase
 from mock import Mock, call, patch, mock_open, DEFAULT
-from blogger.main import parse_args, runner, getFrontMatter
+from blogger.main import parse_args, runner, getFrontMatter, processItem, \
+    printPosts, main
+from blogger.manifest import Manifest, contentHash, fileHashes
 from oauth2client.client import AccessTokenRefreshError
 from datetime import datetime
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import toml
 import yaml
 
 
 @patch('blogger.main.EasyBlogger')
-@patch('blogger.main.pypandoc')
+@patch('blogger.main.getFormatCache')
 class MainTests(TestCase):
     posts = {"items": [
             {
@@ -22,8 +31,19 @@ class MainTests(TestCase):
     ]
     }
 
+    def setUp(self):
+        # keep the manifest and other caches out of the user's cache dir
+        self.cacheDir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ,
+                              {"EASYBLOGGER_CACHE_DIR": self.cacheDir})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.cacheDir)
+
     def test_should_generate_yaml_frontmatter_for_markdown(self,
-                                                           pypandocMock,
+                                                           formatCacheMock,
                                                            blogObjClass):
         item = MainTests.posts["items"][0]
         fm = getFrontMatter(item, "markdown", legacy=False, bare=True)
@@ -33,7 +53,7 @@ class MainTests(TestCase):
         assert fmObj["aliases"][0] == 'url'
 
     def test_should_generate_toml_frontmatter_for_asciidoc(self,
-                                                           pypandocMock,
+                                                           formatCacheMock,
                                                            blogObjClass):
         item = MainTests.posts["items"][0]
         fm = getFrontMatter(item, "asciidoc", legacy=False, bare=True)
@@ -43,7 +63,7 @@ class MainTests(TestCase):
         assert fmObj["aliases"][0] == 'url'
 
     def test_should_generate_legacy_toml_frontmatter(self,
-                                                     pypandocMock,
+                                                     formatCacheMock,
                                                      blogObjClass):
         item = MainTests.posts["items"][0]
         fm = getFrontMatter(item, "asciidoc", legacy=True, bare=True)
@@ -53,7 +73,7 @@ class MainTests(TestCase):
         assert fmObj["PostId"] == '100'
 
     def test_should_generate_legacy_yaml_frontmatter(self,
-                                                     pypandocMock,
+                                                     formatCacheMock,
                                                      blogObjClass):
         item = MainTests.posts["items"][0]
         fm = getFrontMatter(item, "markdown", legacy=True, bare=True)
@@ -61,7 +81,7 @@ class MainTests(TestCase):
         assert fmObj["Title"] == 'title'
         assert fmObj["PostId"] == '100'
 
-    def test_should_process_files_for_update(self, pypandocMock, blogObjClass):
+    def test_should_process_files_for_update(self, formatCacheMock, blogObjClass):
         mo = mock_open(read_data="""
 +++
 title= "t"
@@ -88,12 +108,11 @@ this is the post """)
                 patch('blogger.main.processItem') as mockProcessItem, \
                 patch('blogger.main.glob') as glob:
             glob.iglob.return_value = iter(["file1.asciidoc"])
-            pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
             args = parse_args(['file', "file1.asciidoc"])
             mockProcessItem.side_effect = processItemSideEffect
             exitStatus = runner(args)
 
-    def test_should_process_files_for_create(self, pypandocMock, blogObjClass):
+    def test_should_process_files_for_create(self, formatCacheMock, blogObjClass):
         mo = mock_open(read_data="""
 +++
 title= "t"
@@ -119,13 +138,291 @@ this is the post """)
                 patch('blogger.main.processItem') as mockProcessItem, \
                 patch('blogger.main.glob') as glob:
             glob.iglob.return_value = iter(["file1.asciidoc"])
-            pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
             args = parse_args(['file', "file1.asciidoc"])
             mockProcessItem.side_effect = processItemSideEffect
             exitStatus = runner(args)
 
-    def test_should_invoke_post(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_should_share_one_blogger_across_files(self, formatCacheMock,
+                                                   blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
++++
+
+this is the post """)
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob:
+            glob.iglob.return_value = iter(["file1.adoc", "file2.adoc"])
+            args = parse_args(['--engine', 'serial', 'file', "*.adoc"])
+            runner(args)
+
+        assert blogObjClass.call_count == 1
+        assert mockProcessItem.call_count == 2
+        for c in mockProcessItem.call_args_list:
+            assert c[0][2] is blogObjClass.return_value
+
+    def test_should_prefetch_statuses_for_updates(self, formatCacheMock,
+                                                  blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
+id= "1234"
++++
+
+this is the post """)
+        blogObj = blogObjClass.return_value
+        blogObj.getPostStatuses.return_value = {"1234": "LIVE"}
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob:
+            glob.iglob.return_value = iter(["file1.adoc", "file2.adoc"])
+            args = parse_args(['--engine', 'serial', 'file', "*.adoc"])
+            runner(args)
+
+        blogObj.getPostStatuses.assert_called_once_with(["1234", "1234"],
+                                                        None)
+        for c in mockProcessItem.call_args_list:
+            assert c[0][0].postStatus == "LIVE"
+
+    def test_should_convert_asciidoc_files_together(self, formatCacheMock,
+                                                    blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
+format= "asciidoc"
++++
+this is the post""")
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob:
+            glob.iglob.return_value = iter(["file1.adoc", "file2.adoc"])
+            args = parse_args(['--engine', 'serial', 'file', "*.adoc"])
+            runner(args)
+
+        blogObjClass.return_value.prerender.assert_called_once_with(
+            ["\nthis is the post", "\nthis is the post"], "asciidoc")
+        assert mockProcessItem.call_count == 2
+
+    def test_should_publish_files_a_chunk_at_a_time(self, formatCacheMock,
+                                                    blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
++++
+this is the post""")
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob, \
+                patch('blogger.main.FILE_CHUNK', 2):
+            glob.iglob.return_value = iter(["1.adoc", "2.adoc", "3.adoc"])
+            args = parse_args(['--engine', 'serial', 'file', "*.adoc"])
+            runner(args)
+
+        # the last chunk has a single asciidoc file - nothing to batch
+        blogObjClass.return_value.prerender.assert_called_once_with(
+            ["\nthis is the post", "\nthis is the post"], "asciidoc")
+        assert mockProcessItem.call_count == 3
+        assert mo.return_value.__exit__.call_count == 3
+        for c in mockProcessItem.call_args_list:
+            job = c[0][0]
+            assert job.content is None
+            assert job.title == "t"
+            assert job.engine == "serial"
+            # only the run's settings come from the run's args
+            with self.assertRaises(AttributeError):
+                job.file
+
+    def test_should_read_next_chunk_while_publishing(self, formatCacheMock,
+                                                     blogObjClass):
+        import gevent
+        mo = mock_open(read_data="""
++++
+title= "t"
++++
+this is the post""")
+        # files read by the time each post is done
+        read = []
+
+        def publish(*args):
+            gevent.sleep(0.01)
+            read.append(mo.call_count)
+            return 0
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob, \
+                patch('blogger.main.FILE_CHUNK', 2):
+            mockProcessItem.side_effect = publish
+            glob.iglob.return_value = iter(["1.md", "2.md", "3.md", "4.md"])
+            args = parse_args(['--engine', 'gevent', '--jobs', '1',
+                               '--convert-jobs', '1', 'file', "*.md"])
+            runner(args)
+
+        assert mockProcessItem.call_count == 4
+        # the second chunk was read before the first one's posts were done
+        assert read[0] == 4
+
+    def test_should_publish_the_other_files_if_one_is_broken(
+            self, formatCacheMock, blogObjClass):
+        post = """
++++
+title= "t"
++++
+this is the post"""
+        files = {"1.md": post, "2.md": "no frontmatter", "3.md": post}
+
+        def openFile(filename, *args, **kwargs):
+            return mock_open(read_data=files[filename])()
+
+        with patch('blogger.main.open', side_effect=openFile), \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob, \
+                patch('blogger.main.Manifest') as manifest, \
+                patch('blogger.main.FILE_CHUNK', 2):
+            mockProcessItem.return_value = 0
+            glob.iglob.return_value = iter(sorted(files))
+            args = parse_args(['--engine', 'serial', 'file', "*.md"])
+            result = runner(args)
+
+        assert result == -1
+        assert sorted(c[0][0].filename
+                      for c in mockProcessItem.call_args_list) == \
+            ["1.md", "3.md"]
+        # after the first chunk and at the end
+        assert manifest.return_value.save.call_count == 2
+
+    def test_should_trace_file_stages(self, formatCacheMock, blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
++++
+this is the post""")
+        traceFile = os.path.join(self.cacheDir, "trace.json")
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob, \
+                patch('sys.stderr', new_callable=io.StringIO) as err:
+            glob.iglob.return_value = iter(["file1.md"])
+            main(['easyblogger', '--trace', traceFile, '--timings',
+                  '--engine', 'serial', 'file', "*.md"])
+
+        with open(traceFile) as f:
+            names = [e["name"] for e in json.load(f)["traceEvents"]]
+        assert names == ["frontmatter", "publish"]
+        assert "frontmatter" in err.getvalue()
+
+    def test_should_write_metrics_file(self, formatCacheMock, blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
++++
+this is the post""")
+        metricsFile = os.path.join(self.cacheDir, "easyblogger.prom")
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob:
+            glob.iglob.return_value = iter(["file1.md"])
+            mockProcessItem.return_value = -1
+            result = main(['easyblogger', '--metrics-file', metricsFile,
+                           '--engine', 'serial', 'file', "*.md"])
+
+        with open(metricsFile) as f:
+            text = f.read()
+        assert result == -1
+        assert 'easyblogger_posts_total{result="failed"} 1\n' in text
+        assert "easyblogger_run_success 0\n" in text
+
+    def test_should_skip_unchanged_files(self, formatCacheMock,
+                                         blogObjClass):
+        mo = mock_open(read_data="""
++++
+title= "t"
+id= "1234"
++++
+this is the post""")
+        manifest = Manifest()
+        manifest.record("1234", fileHashes("\nthis is the post", "asciidoc",
+                                           [], {"title": "t"}))
+        manifest.save()
+
+        with patch('blogger.main.open', mo) as openmock, \
+                patch('blogger.main.processItem') as mockProcessItem, \
+                patch('blogger.main.glob') as glob:
+            glob.iglob.return_value = iter(["file1.adoc"])
+            args = parse_args(['--engine', 'serial', 'file', "*.adoc"])
+            runner(args)
+
+        mockProcessItem.assert_not_called()
+
+    def _fileArgs(self, command="update"):
+        args = parse_args(['file', "*.adoc"])
+        args.command = command
+        args.postId = "1234"
+        args.title = "t"
+        args.content = "this is the post"
+        args.format = "asciidoc"
+        args.filters = []
+        args.labels = ["l"]
+        args.publish = False
+        args.publishDate = None
+        args.hashes = fileHashes(args.content, args.format, args.filters,
+                                 {"title": "t"})
+        return args
+
+    def test_should_not_upload_when_rendered_html_is_unchanged(
+            self, formatCacheMock, blogObjClass):
+        args = self._fileArgs()
+        blogObj = blogObjClass.return_value
+        blogObj.getMarkup.return_value = "<p>this is the post</p>"
+        manifest = Manifest()
+        manifest.record("1234", {"source": "old",
+                                 "frontmatter": args.hashes["frontmatter"],
+                                 "html": contentHash(
+                                     "<p>this is the post</p>")})
+
+        assert processItem(args, Mock(), blogObj, manifest) == 0
+
+        blogObj.updatePost.assert_not_called()
+        assert manifest.get("1234")["source"] == args.hashes["source"]
+
+    def test_should_not_convert_when_only_frontmatter_changed(
+            self, formatCacheMock, blogObjClass):
+        args = self._fileArgs()
+        blogObj = blogObjClass.return_value
+        blogObj.updatePost.return_value = {"url": "someurl"}
+        manifest = Manifest()
+        manifest.record("1234", {"source": args.hashes["source"],
+                                 "frontmatter": "old",
+                                 "html": "h"})
+
+        processItem(args, Mock(), blogObj, manifest)
+
+        blogObj.getMarkup.assert_not_called()
+        assert blogObj.updatePost.call_args[0][2] is None
+        assert manifest.get("1234")["frontmatter"] == \
+            args.hashes["frontmatter"]
+
+    def test_should_record_new_posts(self, formatCacheMock, blogObjClass):
+        args = self._fileArgs(command="post")
+        blogObj = blogObjClass.return_value
+        blogObj.getMarkup.return_value = "<p>this is the post</p>"
+        blogObj.post.return_value = {"id": "5678", "url": "someurl"}
+        manifest = Manifest()
+
+        processItem(args, Mock(), blogObj, manifest)
+
+        assert blogObj.post.call_args[0][1] == "<p>this is the post</p>"
+        assert blogObj.post.call_args[1]["fmt"] == "html"
+        assert manifest.get("5678")["source"] == args.hashes["source"]
+
+    def test_should_invoke_post(self, formatCacheMock, blogObjClass):
         args = parse_args(['post', "-t", "t", "-c", "content", '--date',
                            '2018-01-01'])
         print(args)
@@ -139,19 +436,30 @@ this is the post """)
             publishDate='2018-01-01')
         assert exitStatus == 0
 
-    def test_should_invoke_delete(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_should_invoke_delete(self, formatCacheMock, blogObjClass):
         args = parse_args(['delete', '100', "200"])
         blogObj = blogObjClass.return_value
 
-        runner(args)
+        blogObj.deletePosts.return_value = [('100', None), ('200', None)]
+
+        exitStatus = runner(args)
 
-        assert blogObj.deletePost.call_count == 2
-        expected = [call.deletePost('100'), call.deletePost('200')]
+        expected = [call.deletePosts(['100', '200'], None)]
         assert blogObj.mock_calls == expected
+        assert exitStatus == 0
+
+    def test_should_report_failed_deletes(self, formatCacheMock,
+                                          blogObjClass):
+        args = parse_args(['delete', '100', "200"])
+        blogObj = blogObjClass.return_value
+        blogObj.deletePosts.return_value = [('100', None),
+                                            ('200', Exception("404"))]
 
-    def test_should_invoke_update(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+        exitStatus = runner(args)
+
+        assert exitStatus == -1
+
+    def test_should_invoke_update(self, formatCacheMock, blogObjClass):
         args = parse_args(
             ['update', "-t", "t", "-c", "content", "100", '--date',
              '2018-01-01'])
@@ -162,22 +470,116 @@ this is the post """)
 
         blogObj.updatePost.assert_called_with(
             "100", "t", "content", None, [], isDraft=True, fmt="html",
-            publishDate='2018-01-01')
+            publishDate='2018-01-01', postStatus=None)
 
-    def test_should_invoke_getbyid(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_should_invoke_getbyid(self, formatCacheMock, blogObjClass):
         args = parse_args(['get', "-p", "100"])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.return_value = MainTests.posts
 
         runner(args)
 
-        blogObj.getPosts.assert_called_with(postId="100")
+        blogObj.getPosts.assert_called_with(postId="100",
+                                            fields=["id", "title", "url"])
+
+    def test_should_get_many_posts_by_id(self, formatCacheMock, blogObjClass):
+        args = parse_args(['get', "-p", "100", "200", "300"])
+        blogObj = blogObjClass.return_value
+        item = MainTests.posts["items"][0]
+        blogObj.getPostsById.return_value = [("100", item, None),
+                                             ("200", None, None),
+                                             ("300", None, Exception("500"))]
+
+        with patch('blogger.main.printPosts') as printPosts:
+            runner(args)
+
+        blogObj.getPostsById.assert_called_with(["100", "200", "300"], None,
+                                                fields=["id", "title", "url"])
+        assert printPosts.call_count == 1
+
+    def test_should_fail_when_a_batched_get_fails(self, formatCacheMock,
+                                                  blogObjClass):
+        blogObj = blogObjClass.return_value
+        item = MainTests.posts["items"][0]
+        blogObj.getPostsById.return_value = [("100", item, None),
+                                             ("200", None, Exception("500"))]
+
+        with patch('blogger.main.printPosts') as printPosts:
+            result = runner(parse_args(['get', "-p", "100", "200"]))
+
+        assert result == -1
+        assert printPosts.call_count == 1
+
+        blogObj.getPostsById.return_value = [("100", item, None),
+                                             ("200", None, None)]
+        with patch('blogger.main.printPosts'):
+            assert runner(parse_args(['get', "-p", "100", "200"])) == 0
+
+    def test_should_sync_and_answer_from_mirror(self, formatCacheMock,
+                                                blogObjClass):
+        blogObj = blogObjClass.return_value
+        item = dict(MainTests.posts["items"][0], labels=["a"])
+        blogObj.getPosts.return_value = iter([item])
+
+        assert runner(parse_args(['sync'])) == 0
+        blogObj.getPosts.reset_mock()
+        with patch('blogger.main.printPosts') as printPosts:
+            runner(parse_args(['get', '--mirror', '-l', 'a']))
+
+        blogObj.getPosts.assert_not_called()
+        assert printPosts.call_args[0][0]["id"] == "100"
+
+    def test_should_export_post_in_one_write(self, formatCacheMock,
+                                             blogObjClass):
+        item = dict(MainTests.posts["items"][0],
+                    url="http://blog/2018/04/a-post.html",
+                    content=u"<h1>hé</h1>")
+        cwd = os.getcwd()
+        os.chdir(self.cacheDir)
+        try:
+            with patch('blogger.main.getConverter') as getConverter, \
+                    patch('blogger.main.open') as openMock:
+                converter = getConverter.return_value
+                converter.convert_text.return_value = u"# hé"
+                printPosts(item, None, "markdown", writeToFiles=True)
+            with open("a-post.markdown", "rb") as f:
+                written = f.read().decode("utf-8")
+        finally:
+            os.chdir(cwd)
+
+        converter.convert_text.assert_called_once_with(
+            u"<h1>hé</h1>", "markdown", format="html")
+        openMock.assert_not_called()
+        assert written.endswith(u"\n# hé\n")
+        assert "title: title" in written
+        assert sorted(os.listdir(self.cacheDir)) == ["a-post.markdown"]
+
+    def test_should_download_fields_needed_for_doc(self, formatCacheMock,
+                                                   blogObjClass):
+        formatCacheMock.return_value.outputFormats.return_value = ["html"]
+        args = parse_args(['get', "-u", "https://some/url", "-d", "html"])
+        blogObj = blogObjClass.return_value
+        blogObj.getPosts.return_value = []
+
+        runner(args)
+
+        fields = blogObj.getPosts.call_args[1]["fields"]
+        assert "content" in fields and "labels" in fields
+
+    def test_should_write_fields_as_csv(self, formatCacheMock,
+                                        blogObjClass):
+        args = parse_args(['get', "-o", "csv", "-f", "id,title"])
+        blogObj = blogObjClass.return_value
+        blogObj.getPosts.return_value = iter(MainTests.posts["items"])
+
+        with patch('sys.stdout', new_callable=io.StringIO) as out:
+            runner(args)
+
+        assert out.getvalue() == "id,title\n100,title\n"
 
     def test_should_return_error_exit_code_on_exception(self,
-                                                        pypandocMock,
+                                                        formatCacheMock,
                                                         blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
         args = parse_args(['get', "-p", "100"])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.side_effect = AccessTokenRefreshError
@@ -185,8 +587,7 @@ this is the post """)
         rval = runner(args)
         assert rval == -1
 
-    def test_should_invoke_bylabel_bydefault(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_should_invoke_bylabel_bydefault(self, formatCacheMock, blogObjClass):
         args = parse_args(['get'])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.return_value = MainTests.posts
@@ -195,8 +596,7 @@ this is the post """)
 
         blogObj.getPosts.assert_called_with(labels=None, maxResults=None)
 
-    def test_should_invoke_search(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_should_invoke_search(self, formatCacheMock, blogObjClass):
         args = parse_args(['get', "-q", "query"])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.return_value = MainTests.posts
@@ -204,17 +604,16 @@ this is the post """)
         runner(args)
         blogObj.getPosts.assert_called_with(query="query", maxResults=None)
 
-    def test_should_invoke_get_by_url(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_should_invoke_get_by_url(self, formatCacheMock, blogObjClass):
         args = parse_args(['get', "-u", "https://some/url"])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.return_value = MainTests.posts
 
         runner(args)
-        blogObj.getPosts.assert_called_with(url="https://some/url")
+        blogObj.getPosts.assert_called_with(url="https://some/url",
+                                            fields=["id", "title", "url"])
 
-    def test_empty_results_in_get(self, pypandocMock, blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
+    def test_empty_results_in_get(self, formatCacheMock, blogObjClass):
         args = parse_args(['get', "-q", "query"])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.return_value = {"items": []}
@@ -222,12 +621,27 @@ this is the post """)
         runner(args)
         blogObj.getPosts.assert_called_with(query="query", maxResults=None)
 
-    def test_handle_non_existent_keys_in_fields(self, pypandocMock,
+    def test_handle_non_existent_keys_in_fields(self, formatCacheMock,
                                                 blogObjClass):
-        pypandocMock.get_pandoc_formats.return_value = [['a'], ['b']]
         args = parse_args(['get', "-q", "query", "-f", "id,b"])
         blogObj = blogObjClass.return_value
         blogObj.getPosts.return_value = MainTests.posts
 
         runner(args)
         blogObj.getPosts.assert_called_with(query="query", maxResults=None)
+
+
+class StartupTests(TestCase):
+
+    def test_parse_args_should_not_import_optional_modules(self):
+        probe = """
+import sys
+from blogger.main import parse_args
+parse_args(['delete', '100'])
+print(','.join(m for m in ['gevent', 'googleapiclient', 'oauth2client',
+                           'pypandoc', 'yaml', 'toml', 'coloredlogs',
+                           'sqlite3']
+               if m in sys.modules))
+"""
+        out = subprocess.check_output([sys.executable, "-c", probe])
+        assert out.decode("utf-8").strip() == ""
@@ -0,0 +1,122 @@
+import json
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+from mock import Mock, patch
+from blogger.blogger import EasyBlogger
+from blogger.cache import ConversionCache
+from blogger.metrics import (NO_SPAN, Metrics, inc, meterHttp, stopMetrics,
+                             timer, useMetrics)
+
+
+class MetricsTests(TestCase):
+
+    def tearDown(self):
+        stopMetrics()
+
+    def test_should_do_nothing_when_off(self):
+        inc("posts_total", result="published")
+        http = Mock()
+
+        assert timer("conversion_duration_seconds") is NO_SPAN
+        assert meterHttp(http) is http
+
+    def test_should_count_by_labels(self):
+        metrics = useMetrics()
+
+        inc("posts_total", result="published")
+        inc("posts_total", result="published")
+        inc("posts_total", result="skipped")
+
+        series = metrics.values["posts_total"]
+        assert series[(("result", "published"),)] == 2
+        assert series[(("result", "skipped"),)] == 1
+
+    def test_should_write_prometheus_histograms(self):
+        metrics = Metrics()
+        metrics.observe("api_request_duration_seconds", 0.2,
+                        method="posts.list")
+        metrics.observe("api_request_duration_seconds", 3,
+                        method="posts.list")
+
+        text = metrics.textfile()
+
+        assert "# TYPE easyblogger_api_request_duration_seconds " \
+            "histogram" in text
+        assert 'easyblogger_api_request_duration_seconds_bucket' \
+            '{method="posts.list",le="0.1"} 0\n' in text
+        assert 'easyblogger_api_request_duration_seconds_bucket' \
+            '{method="posts.list",le="0.25"} 1\n' in text
+        assert 'easyblogger_api_request_duration_seconds_bucket' \
+            '{method="posts.list",le="+Inf"} 2\n' in text
+        assert 'easyblogger_api_request_duration_seconds_count' \
+            '{method="posts.list"} 2\n' in text
+
+    def test_should_write_json_by_extension(self):
+        metrics = Metrics()
+        metrics.inc("api_requests_total", method="posts.get", status=404)
+        metrics.finish(True)
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "easyblogger.json")
+            metrics.write(path)
+            with open(path) as f:
+                result = json.load(f)
+        finally:
+            shutil.rmtree(tmp)
+
+        assert result["easyblogger_api_requests_total"] == [
+            {"labels": {"method": "posts.get", "status": "404"}, "value": 1}]
+        assert result["easyblogger_run_success"][0]["value"] == 1
+
+    def test_should_meter_http_statuses_and_bytes(self):
+        metrics = useMetrics()
+        http = Mock()
+        http.request.return_value = (Mock(status=200), b"{}")
+
+        meterHttp(http).request("http://x/", "POST", body='{"a": 1}')
+
+        assert metrics.values["http_responses_total"] == {
+            (("status", "200"),): 1}
+        assert metrics.values["http_sent_bytes_total"] == {(): 8}
+        assert metrics.values["http_received_bytes_total"] == {(): 2}
+
+
+@patch('blogger.blogger.getFormatCache')
+class BloggerMetricsTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.metrics = useMetrics()
+        self.blogger = EasyBlogger("id", "secret", "1234")
+        self.blogger.converter = Mock(backend="pandoc")
+        self.blogger.converter.convert_text.return_value = "<h1>hi</h1>"
+        self.blogger.conversionCache = ConversionCache(self.dir)
+
+    def tearDown(self):
+        stopMetrics()
+        shutil.rmtree(self.dir)
+
+    def test_should_count_conversions_and_cache_hits(self, formatCache):
+        formatCache.return_value.version.return_value = "2.19"
+
+        self.blogger.getMarkup("# hi", "markdown")
+        self.blogger.getMarkup("# hi", "markdown")
+
+        values = self.metrics.values
+        assert values["conversion_cache_total"] == {
+            (("result", "hit"),): 1, (("result", "miss"),): 1}
+        assert values["conversion_duration_seconds"][
+            (("backend", "pandoc"),)][-2] == 1
+
+    def test_should_count_api_calls_by_status(self, formatCache):
+        from apiclient.errors import HttpError
+        request = Mock(methodId="blogger.posts.get")
+        request.execute.side_effect = HttpError(Mock(status=404), b"")
+
+        with self.assertRaises(HttpError):
+            self.blogger._execute(request)
+
+        assert self.metrics.values["api_requests_total"] == {
+            (("method", "posts.get"), ("status", "404")): 1}
@@ -0,0 +1,114 @@
+import os
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+from mock import Mock
+from blogger.mirror import Mirror, timestamp
+
+
+def post(postId, updated, labels=None, content=None):
+    item = {"id": postId,
+            "title": "title %s" % postId,
+            "url": "http://blog.example.com/2018/01/%s.html" % postId,
+            "status": "LIVE",
+            "published": "2018-01-%sT10:00:00+05:30" % postId.zfill(2),
+            "updated": updated}
+    if labels:
+        item["labels"] = labels
+    if content:
+        item["content"] = content
+    return item
+
+
+class MirrorTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.mirror = Mirror(os.path.join(self.dir, "mirror.sqlite"))
+        self.blogger = Mock()
+
+    def tearDown(self):
+        self.mirror.close()
+        shutil.rmtree(self.dir)
+
+    def test_should_parse_timestamps_with_offsets(self):
+        assert timestamp("2018-01-01T10:00:00+05:30") == \
+            timestamp("2018-01-01T04:30:00Z")
+        assert timestamp("2018-01-01T10:00:00.123-07:00") == \
+            timestamp("2018-01-01T17:00:00+00:00")
+
+    def test_should_do_full_sync_the_first_time(self):
+        self.blogger.getPosts.return_value = iter([
+            post("2", "2018-02-02T10:00:00Z", ["a", "b"]),
+            post("1", "2018-02-01T10:00:00Z", ["a"])])
+
+        fetched, pruned = self.mirror.sync(self.blogger)
+
+        assert fetched == 2
+        self.blogger.getPosts.assert_called_with(
+            fetchBodies=False, orderBy="updated",
+            status=["draft", "live", "scheduled"])
+        assert [p["id"] for p in self.mirror.posts()] == ["2", "1"]
+
+    def test_should_only_fetch_posts_updated_since_last_sync(self):
+        self.blogger.getPosts.return_value = iter([
+            post("2", "2018-02-02T10:00:00Z"),
+            post("1", "2018-02-01T10:00:00Z")])
+        self.mirror.sync(self.blogger)
+        newer = post("1", "2018-03-01T10:00:00Z", ["new"])
+        older = Mock(side_effect=AssertionError("read too far"))
+
+        def pages():
+            yield newer
+            yield post("2", "2018-02-02T10:00:00Z")
+            yield post("0", "2018-01-01T10:00:00Z")
+            older()
+        self.blogger.getPosts.return_value = pages()
+
+        fetched, pruned = self.mirror.sync(self.blogger)
+
+        assert fetched == 2
+        assert pruned == 0
+        assert [p["id"] for p in self.mirror.posts(labels="new")] == ["1"]
+
+    def test_full_sync_should_drop_deleted_posts(self):
+        self.blogger.getPosts.return_value = iter([
+            post("2", "2018-02-02T10:00:00Z"),
+            post("1", "2018-02-01T10:00:00Z")])
+        self.mirror.sync(self.blogger)
+        self.blogger.getPosts.return_value = iter([
+            post("2", "2018-02-02T10:00:00Z")])
+
+        fetched, pruned = self.mirror.sync(self.blogger, full=True)
+
+        assert pruned == 1
+        assert [p["id"] for p in self.mirror.posts()] == ["2"]
+
+    def test_should_query_by_labels_id_and_url(self):
+        self.blogger.getPosts.return_value = iter([
+            post("3", "2018-02-03T10:00:00Z", ["a", "b"]),
+            post("2", "2018-02-02T10:00:00Z", ["b"]),
+            post("1", "2018-02-01T10:00:00Z", ["a"])])
+        self.mirror.sync(self.blogger)
+
+        assert [p["id"] for p in self.mirror.posts(labels="a,b")] == ["3"]
+        assert [p["id"] for p in self.mirror.posts(labels=["b"])] == \
+            ["3", "2"]
+        assert [p["id"] for p in self.mirror.posts(postIds=["1", "2"])] == \
+            ["2", "1"]
+        assert [p["id"] for p in self.mirror.posts(maxResults=1)] == ["3"]
+        assert [p["id"] for p in self.mirror.posts(
+            url="https://blog.example.com/2018/01/2.html")] == ["2"]
+
+    def test_should_keep_bodies_once_stored(self):
+        self.blogger.getPosts.return_value = iter([
+            post("1", "2018-02-01T10:00:00Z", content="<p>body</p>")])
+        self.mirror.sync(self.blogger, fetchBodies=True)
+        self.blogger.getPosts.return_value = iter([])
+
+        self.mirror.sync(self.blogger)
+
+        assert self.mirror.hasContent()
+        assert self.blogger.getPosts.call_args[1]["fetchBodies"]
+        assert list(self.mirror.posts())[0]["content"] == "<p>body</p>"
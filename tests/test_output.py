@@ -0,0 +1,49 @@
+import io
+import json
+from unittest import TestCase
+from blogger.output import RowWriter
+
+ITEMS = [{"id": "1", "title": u"a, \"quoted\"\ttitle", "labels": ["x", "y"]},
+         {"id": "2", "title": u"multi\nline é"}]
+
+
+class RowWriterTests(TestCase):
+
+    def _write(self, fmt, bufferRows=1000):
+        stream = io.StringIO()
+        writer = RowWriter(fmt, ["id", "title", "labels"], stream,
+                           bufferRows)
+        for item in ITEMS:
+            writer.write(item)
+        writer.close()
+        return stream.getvalue()
+
+    def test_should_write_ndjson(self):
+        rows = [json.loads(l) for l in self._write("ndjson").splitlines()]
+
+        assert rows == ITEMS
+
+    def test_should_escape_csv(self):
+        out = self._write("csv")
+
+        assert out == (u'id,title,labels\n'
+                       u'1,"a, ""quoted""\ttitle","[""x"", ""y""]"\n'
+                       u'2,"multi\nline é",\n')
+
+    def test_should_escape_tsv(self):
+        out = self._write("tsv")
+
+        assert out.startswith(u'id\ttitle\tlabels\n1\t"a, ""quoted""\t')
+
+    def test_should_write_in_chunks(self):
+        stream = io.StringIO()
+        writes = []
+        stream.write = lambda s: writes.append(s)
+        writer = RowWriter("ndjson", ["id"], stream, bufferRows=2)
+
+        for i in range(5):
+            writer.write({"id": str(i)})
+        assert len(writes) == 2
+        writer.close()
+
+        assert "".join(writes).count("\n") == 5
@@ -0,0 +1,110 @@
+import os
+import os.path
+import shutil
+import stat
+import sys
+import tempfile
+from unittest import TestCase
+from mock import Mock, patch
+from blogger.engine import getEngine
+from blogger.pandocserver import PandocServerPool, getConverter, \
+    usePandocServers
+
+# stands in for 'pandoc server' - upper cases the text it's sent
+FAKE_SERVER = """#!%s
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(
+            int(self.headers["Content-Length"])))
+        body = json.dumps({"output": req["text"].upper(), "base64": False,
+                           "messages": []}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+ThreadingHTTPServer(("127.0.0.1", int(sys.argv[3])),
+                    Handler).serve_forever()
+""" % sys.executable
+
+
+class PandocServerPoolTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fallback = Mock()
+        self.fallback.convert_text.return_value = "from pandoc"
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _pandoc(self, script):
+        path = os.path.join(self.dir, "pandoc")
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def test_should_convert_with_server(self):
+        pool = PandocServerPool(2, self._pandoc(FAKE_SERVER), self.fallback)
+        try:
+            assert pool.convert_text("# hi", "html", "markdown") == "# HI"
+            assert pool.convert_text(u"# é", "html", "markdown") == u"# É"
+            assert len(pool.ports) == 2
+        finally:
+            pool.stop()
+        self.fallback.convert_text.assert_not_called()
+
+    def test_should_use_pandoc_for_filters(self):
+        pool = PandocServerPool(1, self._pandoc(FAKE_SERVER), self.fallback)
+
+        assert pool.convert_text("# hi", "html", "markdown",
+                                 filters=["f"]) == "from pandoc"
+        assert pool.ports is None
+
+    def test_should_use_pandoc_without_server_mode(self):
+        pool = PandocServerPool(1, self._pandoc("#!/bin/sh\nexit 1\n"),
+                                self.fallback)
+
+        assert pool.convert_text("# hi", "html", "markdown") == "from pandoc"
+        assert pool.ports == []
+
+    def test_should_convert_concurrently_under_gevent(self):
+        engine = getEngine("gevent")
+        from gevent.monkey import get_original
+        # as if the pool was made before gevent patched threading
+        with patch("threading.local", get_original("_thread", "_local")):
+            pool = PandocServerPool(2, self._pandoc(FAKE_SERVER),
+                                    self.fallback)
+        results = {}
+
+        def convert(i):
+            results[i] = pool.convert_text("# %d" % i, "html", "markdown")
+        try:
+            engine.map(convert, range(6), 6)
+        finally:
+            pool.stop()
+
+        assert results == dict((i, "# %d" % i) for i in range(6))
+        self.fallback.convert_text.assert_not_called()
+
+    def test_should_make_pool_on_first_use(self):
+        usePandocServers(2)
+        try:
+            pool = getConverter()
+            assert isinstance(pool, PandocServerPool)
+            assert getConverter() is pool
+        finally:
+            usePandocServers(0)
@@ -1,3 +1,5 @@
+import os.path
+import threading
 from unittest import TestCase
 from mock import Mock, patch, DEFAULT, PropertyMock
 from blogger import EasyBlogger
@@ -134,3 +136,70 @@ class PostsTests(TestCase):
         assert list[0][-1] == 'c:/some/path/file.adoc'
         self.posts.insert.assert_called()
         req.execute.assert_called()
+
+
+class PrerenderTests(TestCase):
+
+    def setUp(self):
+        self.blogger = EasyBlogger("id", "secret", "1234")
+
+    def test_should_convert_asciidoc_with_one_process(self):
+        def asciidoctor(cmd, shell=False):
+            outdir = cmd[cmd.index("-D") + 1]
+            for name in cmd[cmd.index("-D") + 2:]:
+                with open(name) as src:
+                    html = "<p>%s</p>" % src.read()
+                base = os.path.splitext(os.path.basename(name))[0]
+                with open(os.path.join(outdir, base + ".html"), "w") as out:
+                    out.write(html)
+        self.blogger.check_output = Mock(side_effect=asciidoctor)
+
+        self.blogger.prerender(["one", "two", "one"], "asciidoc")
+
+        assert self.blogger.check_output.call_count == 1
+        assert self.blogger.getMarkup("one", "asciidoc") == "<p>one</p>"
+        assert self.blogger.getMarkup("two", "asciidoc") == "<p>two</p>"
+        assert self.blogger.check_output.call_count == 1
+
+    def test_should_ignore_other_formats(self):
+        self.blogger.check_output = Mock()
+
+        self.blogger.prerender(["# one"], "markdown")
+
+        self.blogger.check_output.assert_not_called()
+
+
+class SharedSessionTests(TestCase):
+
+    def test_should_build_service_once_for_concurrent_workers(self):
+        blogger = EasyBlogger("id", "secret", "1234")
+        service = Mock()
+        started = threading.Event()
+
+        def slowBuild():
+            started.wait(0.1)
+            return service
+        blogger._buildService = Mock(side_effect=slowBuild)
+
+        workers = [threading.Thread(target=blogger._OAuth_Authenticate)
+                   for i in range(5)]
+        for w in workers:
+            w.start()
+        started.set()
+        for w in workers:
+            w.join()
+
+        assert blogger._buildService.call_count == 1
+        assert blogger._OAuth_Authenticate() is service
+
+    def test_should_look_up_blog_by_url_once(self):
+        blogger = EasyBlogger("id", "secret", blogUrl="http://some.blog")
+        blogger.service = Mock()
+        blogs = blogger.service.blogs.return_value
+        blogs.getByUrl.return_value.execute.return_value = {"id": "1234"}
+
+        blogger._setBlog()
+        blogger._setBlog()
+
+        assert blogger.blogId == "1234"
+        assert blogs.getByUrl.call_count == 1
@@ -0,0 +1,177 @@
+import json
+import os.path
+import shutil
+import socket
+import tempfile
+from unittest import TestCase
+from mock import Mock, patch
+from apiclient.errors import HttpError
+from blogger import EasyBlogger
+from blogger.ratelimit import QuotaExceeded, RateLimiter, isRetryable, \
+    pacificOffset
+
+
+def httpError(status, reason=None):
+    resp = Mock()
+    resp.status = status
+    content = json.dumps({"error": {"errors": [{"reason": reason}]}})
+    return HttpError(resp, content.encode("utf-8"))
+
+
+class RateLimiterTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.limiter = RateLimiter(rate=0, retries=2)
+        self.limiter._sleep = Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_should_know_retryable_errors(self):
+        assert isRetryable(httpError(503))
+        assert isRetryable(httpError(429))
+        assert isRetryable(httpError(403, "userRateLimitExceeded"))
+        assert not isRetryable(httpError(403, "forbidden"))
+        assert not isRetryable(httpError(404))
+        assert not isRetryable(ValueError())
+
+    def test_should_only_retry_rate_limits_of_non_idempotent_requests(self):
+        assert isRetryable(httpError(429), idempotent=False)
+        assert isRetryable(httpError(403, "rateLimitExceeded"),
+                           idempotent=False)
+        assert not isRetryable(httpError(503), idempotent=False)
+        assert not isRetryable(socket.timeout(), idempotent=False)
+        assert isRetryable(socket.timeout())
+
+    def test_should_retry_with_backoff(self):
+        fn = Mock(side_effect=[httpError(500), httpError(429), "ok"])
+
+        assert self.limiter.call(fn) == "ok"
+
+        assert fn.call_count == 3
+        assert self.limiter._sleep.call_count == 2
+        for (delay,), _ in self.limiter._sleep.call_args_list:
+            assert 0 <= delay <= 2
+        assert self.limiter.stats["retries"] == 2
+
+    def test_should_give_up_after_retries(self):
+        fn = Mock(side_effect=httpError(503))
+
+        with self.assertRaises(HttpError):
+            self.limiter.call(fn)
+
+        assert fn.call_count == 3
+        assert self.limiter.stats["failed"] == 1
+
+    def test_should_not_retry_other_errors(self):
+        fn = Mock(side_effect=httpError(404))
+
+        with self.assertRaises(HttpError):
+            self.limiter.call(fn)
+
+        assert fn.call_count == 1
+        assert self.limiter.stats["failed"] == 0
+
+    @patch('blogger.ratelimit.time')
+    def test_should_throttle_past_the_burst(self, time):
+        time.time.return_value = 100.0
+        limiter = RateLimiter(rate=2, burst=2)
+        limiter._sleep = Mock()
+
+        limiter.acquire()
+        limiter.acquire()
+        limiter._sleep.assert_not_called()
+        limiter.acquire()
+
+        limiter._sleep.assert_called_once_with(0.5)
+        assert limiter.stats["throttled"] == 1
+        # refilled a second later
+        time.time.return_value = 102.0
+        limiter.acquire()
+        assert limiter._sleep.call_count == 1
+
+    def test_should_only_report_retries_and_failures_to_stderr(self):
+        self.limiter.stats["throttled"] = 3
+        with patch('sys.stderr') as stderr:
+            self.limiter.finish()
+        stderr.write.assert_not_called()
+
+        self.limiter.stats["retries"] = 1
+        with patch('sys.stderr') as stderr:
+            self.limiter.finish()
+        assert "retried: 1" in stderr.write.call_args[0][0]
+
+    def test_should_stop_at_daily_quota_across_runs(self):
+        quotaFile = os.path.join(self.dir, "quota.json")
+        limiter = RateLimiter(rate=0, dailyQuota=3, quotaFile=quotaFile)
+        limiter.acquire(2)
+        limiter.finish()
+
+        limiter = RateLimiter(rate=0, dailyQuota=3, quotaFile=quotaFile)
+        limiter.acquire()
+        with self.assertRaises(QuotaExceeded):
+            limiter.acquire()
+
+    def test_should_reset_quota_at_pacific_midnight(self):
+        # 2024-03-10 09:59 and 10:00 utc - pacific daylight saving time
+        # starts at 2am pst
+        assert pacificOffset(1710064740) == -8 * 3600
+        assert pacificOffset(1710064800) == -7 * 3600
+        # 2024-11-03 08:59 and 09:00 utc - it ends at 2am pdt
+        assert pacificOffset(1730624340) == -7 * 3600
+        assert pacificOffset(1730624400) == -8 * 3600
+
+        limiter = RateLimiter(rate=0)
+        with patch("blogger.ratelimit.time.time") as now:
+            # 2024-07-01 06:59 and 07:00 utc
+            now.return_value = 1719817140
+            assert limiter._quotaDay() == "2024-06-30"
+            now.return_value = 1719817200
+            assert limiter._quotaDay() == "2024-07-01"
+
+
+class LimitedRequestsTests(TestCase):
+
+    def setUp(self):
+        self.blogger = EasyBlogger("id", "secret", "1234")
+        self.blogger.service = Mock()
+        self.blogger.limiter = RateLimiter(rate=0)
+        self.blogger.limiter._sleep = Mock()
+        self.posts = self.blogger.service.posts.return_value
+
+    def test_should_retry_rate_limited_requests(self):
+        req = self.posts.delete.return_value
+        req.execute.side_effect = [httpError(403, "rateLimitExceeded"), {}]
+
+        self.blogger.deletePost("100")
+
+        assert req.execute.call_count == 2
+
+    def test_should_not_resend_failed_inserts(self):
+        req = self.posts.insert.return_value
+        req.execute.side_effect = [httpError(503), {"id": "1"}]
+
+        with self.assertRaises(HttpError):
+            self.blogger.post("t", "<p>c</p>", "")
+
+        assert req.execute.call_count == 1
+        self.blogger.limiter._sleep.assert_not_called()
+
+    def test_should_resend_rate_limited_requests_of_a_batch(self):
+        def newBatch(callback=None):
+            batch = Mock()
+            added = []
+            batch.add.side_effect = lambda req, request_id=None: \
+                added.append(request_id)
+            batch.execute.side_effect = lambda http=None: [
+                callback(i, None, httpError(429) if i == "0" else None)
+                for i in added]
+            return batch
+        self.blogger.service.new_batch_http_request.side_effect = newBatch
+
+        results = list(self.blogger.deletePosts(["1", "2"]))
+
+        assert [error for postId, error in results] == [None, None]
+        assert self.posts.delete.return_value.execute.call_count == 1
+        assert self.blogger.limiter.stats["requests"] == 3
@@ -0,0 +1,62 @@
+import json
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+from blogger.trace import NO_SPAN, Tracer, span, stopTracing, useTracer
+
+
+class TracerTests(TestCase):
+
+    def tearDown(self):
+        stopTracing()
+
+    def test_span_should_do_nothing_when_off(self):
+        assert span("convert") is NO_SPAN
+
+    def test_should_record_spans(self):
+        tracer = useTracer()
+
+        with span("convert markdown", file="a.md"):
+            pass
+        with span("setBlog"):
+            pass
+
+        names = [e["name"] for e in tracer.events]
+        assert names == ["convert markdown", "setBlog"]
+        assert tracer.events[0]["ph"] == "X"
+        assert tracer.events[0]["args"] == {"file": "a.md"}
+
+    def test_should_record_failed_stages(self):
+        tracer = useTracer()
+
+        with self.assertRaises(ValueError):
+            with span("api"):
+                raise ValueError()
+
+        assert len(tracer.events) == 1
+
+    def test_should_summarize_percentiles(self):
+        tracer = Tracer()
+        tracer.events = [{"name": "api", "dur": d * 1000}
+                         for d in range(1, 101)]
+
+        count, p50, p95, most = tracer.timings()["api"]
+
+        assert (count, p50, p95, most) == (100, 50, 95, 100)
+        assert "api" in tracer.summary()
+
+    def test_should_write_chrome_trace(self):
+        tracer = useTracer()
+        with span("discovery"):
+            pass
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "trace.json")
+            tracer.write(path)
+            with open(path) as f:
+                events = json.load(f)["traceEvents"]
+        finally:
+            shutil.rmtree(tmp)
+
+        assert events[0]["name"] == "discovery"
@@ -0,0 +1,66 @@
+import threading
+from unittest import TestCase
+from mock import Mock
+from blogger import EasyBlogger
+from blogger.transport import HttpPool
+
+
+class HttpPoolTests(TestCase):
+
+    def test_should_reuse_returned_connections(self):
+        pool = HttpPool(Mock(side_effect=lambda: Mock()), size=2)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        assert first is second
+        assert pool.factory.call_count == 1
+
+    def test_should_give_concurrent_users_their_own(self):
+        pool = HttpPool(Mock(side_effect=lambda: Mock()), size=2)
+
+        with pool.connection() as a, pool.connection() as b, \
+                pool.connection() as c:
+            assert len(set([id(a), id(b), id(c)])) == 3
+
+        # only size are kept - the extra one is closed
+        assert len(pool.idle) == 2
+        assert pool.factory.call_count == 3
+
+
+class PooledRequestsTests(TestCase):
+
+    def setUp(self):
+        self.blogger = EasyBlogger("id", "secret", "1234")
+        self.blogger.service = Mock()
+        self.blogger.credentials = Mock()
+        self.blogger.credentials.authorize.side_effect = lambda http: http
+
+    def test_should_verify_certificates(self):
+        http = self.blogger._newHttp()
+
+        assert not http.disable_ssl_certificate_validation
+
+    def test_should_send_concurrent_requests_on_separate_connections(self):
+        inFlight = threading.Barrier(3)
+        used = []
+
+        def execute(http=None):
+            used.append(http)
+            # all three are in flight at once
+            inFlight.wait(5)
+            return {}
+        request = Mock()
+        request.execute.side_effect = execute
+
+        workers = [threading.Thread(target=self.blogger._execute,
+                                    args=(request,)) for i in range(3)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        assert len(set(id(h) for h in used)) == 3
+        assert len(self.blogger._httpPool.idle) == 3
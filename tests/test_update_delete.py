@@ -114,6 +114,39 @@ class UpdateDeleteTests(TestCase):
         assert self.posts.patch.call_count == 1
         req.execute.assert_called()
 
+    def test_should_not_look_up_known_status(self):
+        self.blogger.updatePost("4321", "t", "c", "l", postStatus="LIVE")
+
+        self.posts.get.assert_not_called()
+        self.posts.publish.assert_not_called()
+        assert self.posts.patch.call_count == 1
+
+    def test_should_keep_content_of_scheduled_post(self):
+        # only the frontmatter of the post's file changed
+        getreq = self.posts.get.return_value
+        getreq.execute.return_value = {"content": "<p>c</p>"}
+
+        self.blogger.updatePost("4321", "t", None, "l",
+                                postStatus="SCHEDULED")
+
+        self.posts.get.assert_called_once_with(
+            blogId="1234", postId="4321", view="AUTHOR", fields="content")
+        body = self.posts.update.call_args[1]["body"]
+        assert body["title"] == "t"
+        assert body["content"] == "<p>c</p>"
+        assert body["labels"] == ["l"]
+
+    def test_should_get_statuses_by_id(self):
+        self.blogger.getPostsById = Mock(return_value=[
+            ("1", {"status": "LIVE"}, None),
+            ("2", None, None)])
+
+        statuses = self.blogger.getPostStatuses(["1", "2"])
+
+        assert statuses == {"1": "LIVE"}
+        self.blogger.getPostsById.assert_called_with(["1", "2"], None,
+                                                     fields="status")
+
     def test_update_should_fail_if_nothing_specified(self):
         with self.assertRaises(ValueError):
             self.blogger.updatePost("4321")
@@ -125,3 +158,37 @@ class UpdateDeleteTests(TestCase):
 
         self.posts.delete.assert_called_with(blogId="1234", postId="12345")
         req.execute.assert_called()
+
+    def _fakeBatch(self, errors={}):
+        batches = []
+
+        def newBatch(callback=None):
+            batch = Mock()
+            added = []
+            batch.add.side_effect = lambda req, request_id=None: \
+                added.append(request_id)
+
+            def execute(http=None):
+                for requestId in added:
+                    callback(requestId, {}, errors.get(requestId))
+            batch.execute.side_effect = execute
+            batches.append(batch)
+            return batch
+        self.blogger.service.new_batch_http_request.side_effect = newBatch
+        return batches
+
+    def test_should_delete_posts_in_batches(self):
+        batches = self._fakeBatch(errors={"1": Exception("forbidden")})
+
+        results = list(self.blogger.deletePosts(["1", "2", "3"],
+                                                batchSize=2))
+
+        assert len(batches) == 1
+        assert batches[0].add.call_count == 2
+        assert batches[0].execute.call_count == 1
+        # the last one is sent on its own
+        assert self.posts.delete.return_value.execute.call_count == 1
+        assert [r[0] for r in results] == ["1", "2", "3"]
+        assert results[0][1] is None
+        assert str(results[1][1]) == "forbidden"
+        assert results[2][1] is None
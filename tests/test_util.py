@@ -0,0 +1,50 @@
+import os
+import os.path
+import shutil
+import stat
+import tempfile
+from unittest import TestCase
+from mock import patch
+from blogger.util import NEW_FILE_MODE, atomicWrite, atomicWriter
+
+
+class AtomicWriteTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "file")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _mode(self):
+        return stat.S_IMODE(os.stat(self.path).st_mode)
+
+    def test_should_write_new_files_without_touching_the_umask(self):
+        with patch("os.umask") as umask:
+            atomicWrite(self.path, b"data")
+
+        umask.assert_not_called()
+        assert self._mode() == NEW_FILE_MODE
+
+    def test_should_keep_the_mode_of_existing_files(self):
+        atomicWrite(self.path, b"old")
+        os.chmod(self.path, 0o640)
+
+        atomicWrite(self.path, b"new")
+
+        assert self._mode() == 0o640
+        with open(self.path, "rb") as f:
+            assert f.read() == b"new"
+
+    def test_should_leave_the_file_alone_if_writing_fails(self):
+        atomicWrite(self.path, b"old")
+
+        with self.assertRaises(ValueError):
+            with atomicWriter(self.path) as fp:
+                fp.write(b"half")
+                raise ValueError("failed")
+
+        with open(self.path, "rb") as f:
+            assert f.read() == b"old"
+        assert os.listdir(self.dir) == ["file"]